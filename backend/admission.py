@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request, session, jsonify
+
+# -----------------------
+# Admission control for auth routes
+# -----------------------
+# POSTs to the login/signup/reset routes are CPU-heavy (password hashing) and the first
+# target of credential stuffing. Before the view runs, each one must get:
+#   1. a token from its client IP's bucket          -> else 429 + Retry-After
+#   2. a token from the target account's bucket     -> else 429 + Retry-After
+#   3. one of `max_concurrent` auth slots            -> else 503 + Retry-After
+# so a burst is turned away in microseconds and the board/timer routes keep their threads.
+# Behind a reverse proxy, wrap the app in werkzeug's ProxyFix so remote_addr is the client.
+
+AUTH_ENDPOINTS = ("login", "signup", "forgot_password", "verify_otp", "reset_password")
+
+
+class KeyedTokenBuckets:
+    """
+    One token bucket per key: `rate` tokens per second, up to `burst`.
+    A bucket idle long enough to have refilled is indistinguishable from a new one, so it
+    is dropped; at most `max_keys` are kept (least recently used go first).
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_after = burst / rate
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), oldest first
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """Take one token. Returns 0 if granted, else the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+            return wait
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated) = next(iter(buckets.items()))
+            if len(buckets) <= self.max_keys and now - updated < self.idle_after:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """One per app (app.extensions["admission"])."""
+
+    def __init__(self, ip_rate=1.0, ip_burst=10, account_rate=0.2, account_burst=5,
+                 max_concurrent=4, queue_timeout=0.1, max_keys=100000, endpoints=AUTH_ENDPOINTS):
+        self.by_ip = KeyedTokenBuckets(ip_rate, ip_burst, max_keys)
+        self.by_account = KeyedTokenBuckets(account_rate, account_burst, max_keys)
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.endpoints = frozenset(endpoints)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected_ip = 0
+        self.rejected_account = 0
+        self.rejected_busy = 0
+
+    def init_app(self, app):
+        app.extensions["admission"] = self
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    @staticmethod
+    def _account_key():
+        # the account a request targets (never trusted for anything but rate limiting)
+        if request.endpoint in ("verify_otp", "reset_password"):
+            value = session.get("reset_email")
+        elif request.endpoint == "forgot_password":
+            value = request.form.get("email")
+        else:
+            value = request.form.get("username")
+        value = (value or "").strip().lower()
+        return f"{request.endpoint}:{value}" if value else None
+
+    def _admit(self):
+        if request.method != "POST" or request.endpoint not in self.endpoints:
+            return None
+
+        wait = self.by_ip.take(request.remote_addr or "-")
+        if wait:
+            self.rejected_ip += 1
+            return self._reject(429, wait, "Too many attempts from your network. Please slow down.")
+
+        account = self._account_key()
+        if account:
+            wait = self.by_account.take(account)
+            if wait:
+                self.rejected_account += 1
+                return self._reject(429, wait, "Too many attempts for this account. Please try again later.")
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected_busy += 1
+            return self._reject(503, 1, "The server is busy. Please try again in a moment.")
+        g.admission_slot = True
+        with self._lock:
+            self._in_flight += 1
+        return None
+
+    def _release(self, exc):
+        if g.pop("admission_slot", False):
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    @staticmethod
+    def _reject(status, wait, message):
+        response = jsonify({"success": False, "message": message})
+        response.status_code = status
+        response.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+        return response
+
+    def stats(self):
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrent": self.max_concurrent,
+            "ip_keys": len(self.by_ip),
+            "account_keys": len(self.by_account),
+            "rejected_ip": self.rejected_ip,
+            "rejected_account": self.rejected_account,
+            "rejected_busy": self.rejected_busy,
+        }
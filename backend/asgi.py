@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from app import create_app, event_subscription, EVENTS_HEADERS
+
+# -----------------------
+# ASGI entry point
+# -----------------------
+# The same app on an asyncio server, e.g.
+#     uvicorn --factory asgi:create_asgi_app --workers 4
+# Under a WSGI server every open request holds a thread. Here a connection is a coroutine:
+# the request body is read on the event loop, the Flask view (the very view the WSGI
+# server runs, so the two tiers share every rule) runs on a small pool of view threads,
+# and its response (read on that thread, up to ASGI_RESPONSE_BUFFER bytes) is written
+# back from the event loop. A slow client or an idle /events subscriber therefore holds
+# neither a thread nor a pooled connection; /events itself is served on the loop by
+# EventBroker.astream(). At most ASGI_VIEW_THREADS views run at once and further requests
+# wait as coroutines, so thread count and memory stay flat however many connections are
+# open. Only responses over the buffer (a large time entry export) keep their view
+# thread, and its connection, until the client has read them, as under a WSGI server.
+
+STREAM_CHUNK = 64 * 1024  # bytes per send once a response outgrows ASGI_RESPONSE_BUFFER
+
+
+class AsgiApp:
+    """ASGI callable around an app built by create_app(). One per process (app.extensions["asgi"])."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.max_body = flask_app.config["ASGI_MAX_BODY"]
+        self.response_buffer = flask_app.config["ASGI_RESPONSE_BUFFER"]
+        self.threads = flask_app.config["ASGI_VIEW_THREADS"] or flask_app.config["DB_POOL_SIZE"]
+        # threads start with the first request
+        self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix="asgi-view")
+        self._connections = 0
+        self._streams = 0
+        self._views = 0  # running on a view thread or waiting for one
+        self._unbuffered = 0
+        self._lock = threading.Lock()  # for _unbuffered, the only count view threads update
+        flask_app.extensions["asgi"] = self
+        flask_app.extensions["metrics"].add_gauges("asgi", self.stats)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            # no websocket routes: refuse the handshake
+            await receive()
+            await send({"type": "websocket.close"})
+            return
+        self._connections += 1
+        try:
+            await self._http(scope, receive, send)
+        except _Disconnected:
+            pass
+        finally:
+            self._connections -= 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # let running views finish (and return their connections)
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(scope, receive)
+        if body is None:
+            return await _send_plain(send, 413, b"Request body too large")
+        environ = _environ(scope, body)
+        context = contextvars.copy_context()
+        if scope["method"] == "GET" and environ["PATH_INFO"] == "/events":
+            return await self._events(context, environ, receive, send)
+
+        disconnected = threading.Event()
+        watcher = asyncio.ensure_future(_disconnect(receive))
+        watcher.add_done_callback(lambda _: disconnected.set())
+        try:
+            buffered = await self._run(context, self._respond, environ, send,
+                                       asyncio.get_running_loop(), disconnected)
+        finally:
+            watcher.cancel()
+        if buffered:
+            status, headers, body = buffered
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+    async def _events(self, context, environ, receive, send):
+        subscription = await self._run(context, self._subscribe, environ)
+        if not isinstance(subscription, tuple):
+            response = subscription
+            await send({"type": "http.response.start", "status": response.status_code,
+                        "headers": _headers(response.headers.to_wsgi_list())})
+            return await send({"type": "http.response.body", "body": response.get_data()})
+
+        broker, user_id, last_id = subscription
+        headers = {"Content-Type": "text/event-stream", **EVENTS_HEADERS}
+        await send({"type": "http.response.start", "status": 200, "headers": _headers(headers.items())})
+        self._streams += 1
+        try:
+            await _until_disconnected(receive, self._send_events(send, broker.astream(user_id, last_id)))
+        finally:
+            self._streams -= 1
+
+    @staticmethod
+    async def _send_events(send, stream):
+        try:
+            async for frame in stream:
+                await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+        finally:
+            await stream.aclose()
+
+    async def _read_body(self, scope, receive):
+        """The whole request body, or None if it is over ASGI_MAX_BODY."""
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body:
+                return None
+        parts, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _Disconnected()
+            part = message.get("body", b"")
+            size += len(part)
+            if size > self.max_body:
+                return None
+            parts.append(part)
+            if not message.get("more_body"):
+                return b"".join(parts)
+
+    async def _run(self, context, fn, *args):
+        # in the request's own copy of the loop's context: nothing a view sets in a context
+        # variable (Flask's request and app contexts) is seen by the next one on that thread
+        self._views += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+        finally:
+            self._views -= 1
+
+    # -----------------------
+    # On view threads
+    # -----------------------
+    def _respond(self, environ, send, loop, disconnected):
+        """
+        Run the view. Returns (status, headers, body) for the event loop to send, or None if
+        the body outgrew ASGI_RESPONSE_BUFFER and this thread has sent it (stopping if the client went away).
+        """
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), _headers(headers)]
+
+        response = _ResponseBody(self.flask_app(environ, start_response))
+        try:
+            chunk, more = response.read(self.response_buffer)
+            if not more:
+                return started[0], started[1], chunk
+            with self._lock:
+                self._unbuffered += 1
+            try:
+                _wait(loop, send({"type": "http.response.start", "status": started[0], "headers": started[1]}))
+                while more and not disconnected.is_set():
+                    _wait(loop, send({"type": "http.response.body", "body": chunk, "more_body": True}))
+                    chunk, more = response.read(STREAM_CHUNK)
+                if not more:
+                    _wait(loop, send({"type": "http.response.body", "body": chunk}))
+            finally:
+                with self._lock:
+                    self._unbuffered -= 1
+            return None
+        finally:
+            response.close()
+
+    def _subscribe(self, environ):
+        with self.flask_app.request_context(environ):
+            try:
+                return event_subscription()
+            except HTTPException as e:
+                return e.get_response()
+
+    def stats(self):
+        return {
+            "connections": self._connections,
+            "event_streams": self._streams,
+            "views_in_flight": self._views,
+            "unbuffered_responses": self._unbuffered,
+            "view_threads": self.threads,
+        }
+
+
+class _ResponseBody:
+    """A WSGI response iterable, read on its view thread."""
+
+    def __init__(self, result):
+        self.result = result
+        self.chunks = iter(result)
+        self.closed = False
+
+    def read(self, limit):
+        """The next `limit` or so bytes of the body, and whether more may follow."""
+        parts, size = [], 0
+        for chunk in self.chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= limit:
+                return b"".join(parts), True
+        self.close()
+        return b"".join(parts), False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if hasattr(self.result, "close"):
+                self.result.close()
+
+
+class _Disconnected(Exception):
+    pass
+
+
+async def _until_disconnected(receive, coro):
+    """Run coro until it finishes or the client goes away (the request body has been read already)."""
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_disconnect(receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if task.done() and not task.cancelled():
+        task.result()
+
+def _wait(loop, coro):
+    """Run coro on the event loop from a view thread and wait for it (send() applies the client's backpressure)."""
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+async def _disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def _send_plain(send, status, body):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+def _headers(pairs):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in pairs]
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 strings: bytes decoded as latin-1)."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode().decode("latin-1"),
+        "PATH_INFO": path.encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        if key in environ:
+            value = environ[key] + ("; " if name == "COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+def create_asgi_app(config=None):
+    """ASGI app over create_app(config), e.g. uvicorn --factory asgi:create_asgi_app."""
+    return AsgiApp(create_app(config))
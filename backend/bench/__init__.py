@@ -0,0 +1,8 @@
+"""
+Reproducible benchmarks for the core routes.
+
+    cd backend
+    python -m bench generate --db /tmp/bench.db --users 1000 --tasks 500000 --entries 5000000
+    python -m bench run --db /tmp/bench.db --mode http --concurrency 16 --output results.json
+    python -m bench compare baseline.json results.json --threshold 10
+"""
@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+
+from bench import datagen, runner
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Task tracker route benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="build a synthetic database")
+    gen.add_argument("--db", required=True)
+    gen.add_argument("--users", type=int, default=100)
+    gen.add_argument("--tasks", type=int, default=10000)
+    gen.add_argument("--entries", type=int, default=50000)
+    gen.add_argument("--weeks", type=int, default=12)
+    gen.add_argument("--seed", type=int, default=42)
+
+    run = sub.add_parser("run", help="benchmark the routes against a database")
+    run.add_argument("--db", required=True)
+    run.add_argument("--routes", nargs="+", choices=sorted(runner.ROUTES), default=None)
+    run.add_argument("--requests", type=int, default=200, help="requests per route")
+    run.add_argument("--mode", choices=("client", "http"), default="client")
+    run.add_argument("--concurrency", type=int, default=8, help="client threads in http mode")
+    run.add_argument("--users", type=int, default=20, help="distinct users to log in as")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--output", help="write results JSON here (default: stdout)")
+
+    cmp = sub.add_parser("compare", help="compare two result files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--metric", default="p95_ms")
+    cmp.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        from passwords import hash_password
+        datagen.generate(args.db, users=args.users, tasks=args.tasks, entries=args.entries,
+                         weeks=args.weeks, seed=args.seed,
+                         password_hash=hash_password(datagen.BENCH_PASSWORD))
+        return 0
+
+    if args.command == "run":
+        results = runner.run(args.db, routes=args.routes, requests=args.requests, mode=args.mode,
+                             concurrency=args.concurrency, users=args.users, seed=args.seed)
+        for name, stats in results["routes"].items():
+            print(f"{name:15} p50 {stats['p50_ms']:>9} ms  p95 {stats['p95_ms']:>9} ms  "
+                  f"p99 {stats['p99_ms']:>9} ms  {stats['throughput_rps']:>8} req/s  "
+                  f"{stats['sql_statements_per_request']:>6} sql/req  errors {stats['errors']}",
+                  file=sys.stderr)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output + "\n")
+        else:
+            print(output)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressed = runner.compare(baseline, current, args.threshold, args.metric)
+    for name, before, after, change in rows:
+        flag = "  REGRESSION" if name in regressed else ""
+        print(f"{name:15} {args.metric} {before:>9} -> {after:>9} ({change:+.1f}%){flag}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
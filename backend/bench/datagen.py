@@ -0,0 +1,139 @@
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from migrations import migrate
+from timestamps import epoch_seconds, epoch_day
+
+# -----------------------
+# Synthetic database generator
+# -----------------------
+# Builds a database with the app's real schema (same migrations) and a realistic spread of
+# data: tasks across the three statuses, time entries over the last `weeks` weeks with
+# the densest activity in the current week, and one open timer for a share of the users.
+
+STATUSES = ("todo", "inprogress", "done")
+STATUS_WEIGHTS = (0.25, 0.15, 0.60)
+PRIORITIES = ("low", "medium", "high")
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+WORDS = ("fix", "review", "deploy", "write", "design", "refactor", "test", "plan", "migrate",
+         "update", "report", "invoice", "client", "sprint", "backend", "frontend", "docs", "bug")
+BENCH_PASSWORD = "Password123!"
+BATCH = 10000
+
+def _title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize()
+
+def _ts(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+def _batched(rows, conn, sql):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+def generate(db_path, users=100, tasks=10000, entries=50000, weeks=12, open_timer_share=0.2,
+             seed=42, password_hash=None, progress=print):
+    """
+    Create (or replace) db_path with synthetic data. Returns the row counts.
+    password_hash: stored for every user; pass app.hash_password(BENCH_PASSWORD) so the
+    benchmark can log in as anyone.
+    """
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    # bulk-load settings; the app's own pragmas apply when it opens the file
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+
+    started = time.perf_counter()
+    now = datetime.now().replace(microsecond=0)
+    first_day = now - timedelta(weeks=weeks)
+    span = int((now - first_day).total_seconds())
+
+    conn.execute("BEGIN")
+    _batched(((f"user{i:06d}", f"Bench User{i}", f"user{i:06d}@bench.local", password_hash or "x$x")
+              for i in range(1, users + 1)),
+             conn, "INSERT INTO users (username, full_name, email, password_hash) VALUES (?, ?, ?, ?)")
+    conn.commit()
+    progress(f"users: {users}")
+
+    def task_rows():
+        for _ in range(tasks):
+            created = first_day + timedelta(seconds=rng.randrange(span))
+            updated = min(created + timedelta(hours=rng.randint(0, 72)), now)
+            yield (_title(rng), _title(rng), rng.choice(PRIORITIES), rng.choice((None, 0.5, 1, 2, 4)),
+                   rng.choice(DAYS), rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                   rng.randint(1, users), _ts(created), epoch_seconds(created), _ts(updated), epoch_seconds(updated))
+
+    conn.execute("BEGIN")
+    _batched(task_rows(), conn, """
+    INSERT INTO tasks (title, description, priority, estimated_duration, day, status, user_id,
+                       created_at, created_ts, updated_at, updated_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """)
+    conn.commit()
+    progress(f"tasks: {tasks}")
+
+    # owner of each task, so entries are logged against the user's own tasks
+    owners = [r[0] for r in conn.execute("SELECT user_id FROM tasks ORDER BY id")]
+    by_user = {}
+    for task_id, user_id in enumerate(owners, start=1):
+        by_user.setdefault(user_id, []).append(task_id)
+    task_ids = list(range(1, len(owners) + 1))
+    current_week = now - timedelta(days=now.weekday())
+
+    def entry_rows():
+        for i in range(entries):
+            task_id = rng.choice(task_ids)
+            user_id = owners[task_id - 1]
+            # a third of the entries land in the current week
+            if rng.random() < 0.33:
+                start = current_week + timedelta(seconds=rng.randrange(max(int((now - current_week).total_seconds()), 1)))
+            else:
+                start = first_day + timedelta(seconds=rng.randrange(span))
+            minutes = rng.randint(5, 240)
+            end = start + timedelta(minutes=minutes)
+            yield (task_id, user_id, _ts(start), epoch_seconds(start), _ts(end), epoch_seconds(end), minutes,
+                   start.strftime("%Y-%m-%d"), epoch_day(start))
+            if i and i % 500000 == 0:
+                progress(f"entries: {i}")
+
+    conn.execute("BEGIN")
+    _batched(entry_rows(), conn, """
+    INSERT INTO time_entries (task_id, user_id, start_time, start_ts, end_time, end_ts, duration_minutes,
+                              work_date, work_day)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """)
+    open_timers = []
+    for user_id, user_tasks in by_user.items():
+        if rng.random() < open_timer_share:
+            start = now - timedelta(minutes=rng.randint(1, 120))
+            open_timers.append((rng.choice(user_tasks), user_id, _ts(start), epoch_seconds(start),
+                                start.strftime("%Y-%m-%d"), epoch_day(start)))
+    conn.executemany("""
+    INSERT INTO time_entries (task_id, user_id, start_time, start_ts, work_date, work_day) VALUES (?, ?, ?, ?, ?, ?)
+    """, open_timers)
+    conn.commit()
+    progress(f"entries: {entries} (+{len(open_timers)} open timers)")
+
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("users", "tasks", "time_entries", "daily_time_rollup")}
+    conn.close()
+    progress(f"generated in {time.perf_counter() - started:.1f}s: {counts}")
+    return counts
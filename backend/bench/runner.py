@@ -0,0 +1,241 @@
+import http.cookiejar
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+from app import create_app
+from bench.datagen import BENCH_PASSWORD
+
+# -----------------------
+# Route benchmark
+# -----------------------
+# Drives the core routes either in-process through Flask's test client ("client" mode)
+# or over a local threaded HTTP server with concurrent clients ("http" mode), and
+# reports latency percentiles, throughput and SQL statements per request.
+
+ROUTES = {
+    "dashboard": ("GET", "/dashboard"),
+    "timesheet": ("GET", "/timesheet"),
+    "weekly_report": ("GET", "/report/weekly"),
+    "api_tasks": ("GET", "/api/tasks"),
+    "api_search": ("GET", "/api/tasks/search?q=rep"),
+    "timer_start": ("POST", "/timer/start/{task_id}"),
+    "timer_stop": ("POST", "/timer/stop/{task_id}"),
+}
+
+
+class StatementCounter:
+    """
+    Counts SQL statements per request, per thread and in total. Takes them from the request
+    metrics (metrics.py), so a timer request includes its intent run on the writer thread and
+    its share of the batch's BEGIN/COMMIT (writer.py).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def init_app(self, app):
+        # teardown functions run in reverse order of registration: this one sees g.sql_stats
+        # before the metrics' own teardown records and drops it
+        app.teardown_request(self._count)
+
+    def _count(self, exc):
+        stats = g.get("sql_stats")
+        if stats is None:
+            return
+        self._local.count = getattr(self._local, "count", 0) + stats[0]
+        with self._lock:
+            self.total += stats[0]
+
+    def take(self):
+        count = getattr(self._local, "count", 0)
+        self._local.count = 0
+        return count
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def summarize(latencies, errors, elapsed, statements):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        "requests": count,
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / count) if count else None,
+        "max_ms": ms(latencies[-1]) if count else None,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else None,
+        "sql_statements_per_request": round(statements / count, 2) if count else None,
+    }
+
+def _pick_users(db_path, sample, rng):
+    conn = sqlite3.connect(db_path)
+    users = [r[0] for r in conn.execute("""
+    SELECT u.username, u.id FROM users u
+    WHERE EXISTS (SELECT 1 FROM tasks t WHERE t.user_id = u.id)
+    """)]
+    picked = rng.sample(users, min(sample, len(users)))
+    tasks = {}
+    for username in picked:
+        tasks[username] = [r[0] for r in conn.execute("""
+        SELECT t.id FROM tasks t JOIN users u ON u.id = t.user_id WHERE u.username = ? LIMIT 50
+        """, (username,))]
+    conn.close()
+    return picked, tasks
+
+def _db_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("users", "tasks", "time_entries")}
+    conn.close()
+    return counts
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# -----------------------
+# Runners
+# -----------------------
+def run_client(app, routes, requests, users, tasks, counter, rng):
+    clients = {}
+    for username in users:
+        client = app.test_client()
+        client.post("/login", data={"username": username, "password": BENCH_PASSWORD})
+        clients[username] = client
+
+    results = {}
+    for name in routes:
+        method, path = ROUTES[name]
+        latencies, errors, statements = [], 0, 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            username = rng.choice(users)
+            url = path.format(task_id=rng.choice(tasks[username]))
+            counter.take()
+            t0 = time.perf_counter()
+            response = clients[username].open(url, method=method)
+            response.get_data()  # drain streamed bodies
+            latencies.append(time.perf_counter() - t0)
+            statements += counter.take()
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = summarize(latencies, errors, time.perf_counter() - started, statements)
+    return results
+
+def run_http(app, routes, requests, users, tasks, counter, rng, concurrency):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    openers = {}
+    for username in users:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        opener.open(base + "/login", urllib.parse.urlencode(
+            {"username": username, "password": BENCH_PASSWORD}).encode()).read()
+        openers[username] = opener
+
+    def hit(method, url, username):
+        request = urllib.request.Request(base + url, method=method, data=b"" if method == "POST" else None)
+        t0 = time.perf_counter()
+        try:
+            with openers[username].open(request) as response:
+                response.read()
+                ok = response.status < 400
+        except urllib.error.HTTPError as e:
+            ok = e.code < 400
+        return time.perf_counter() - t0, ok
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for name in routes:
+                method, path = ROUTES[name]
+                jobs = []
+                for _ in range(requests):
+                    username = rng.choice(users)
+                    jobs.append((method, path.format(task_id=rng.choice(tasks[username])), username))
+                statements_before = counter.total
+                started = time.perf_counter()
+                outcomes = list(executor.map(lambda job: hit(*job), jobs))
+                elapsed = time.perf_counter() - started
+                results[name] = summarize([o[0] for o in outcomes], sum(1 for o in outcomes if not o[1]),
+                                          elapsed, counter.total - statements_before)
+    finally:
+        server.shutdown()
+    return results
+
+def run(db_path, routes=None, requests=200, mode="client", concurrency=8, users=20, seed=1):
+    routes = list(routes or ROUTES)
+    rng = random.Random(seed)
+    picked, tasks = _pick_users(db_path, users, rng)
+    if not picked:
+        raise SystemExit(f"{db_path} has no users with tasks; run 'python -m bench generate' first")
+
+    # every benchmark client logs in from 127.0.0.1: don't let auth rate limits get in the way
+    app = create_app({"DB_PATH": db_path, "DB_POOL_SIZE": max(concurrency, 8), "ADMISSION_ENABLED": False})
+    counter = StatementCounter()
+    counter.init_app(app)
+
+    if mode == "http":
+        results = run_http(app, routes, requests, picked, tasks, counter, rng, concurrency)
+    else:
+        results = run_client(app, routes, requests, picked, tasks, counter, rng)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "mode": mode,
+            "concurrency": concurrency if mode == "http" else 1,
+            "requests_per_route": requests,
+            "users_sampled": len(picked),
+            "db": _db_counts(db_path),
+            "pool": app.extensions["db_pool"].stats(),
+        },
+        "routes": results,
+    }
+
+def compare(baseline, current, threshold_pct=10.0, metric="p95_ms"):
+    """Per-route change in `metric`; returns (rows, regressed) where regressed lists routes over threshold."""
+    rows, regressed = [], []
+    for name, stats in current["routes"].items():
+        before = baseline["routes"].get(name, {}).get(metric)
+        after = stats.get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((name, before, after, round(change, 1)))
+        if change > threshold_pct:
+            regressed.append(name)
+    return rows, regressed
@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from db import ConnectionPool
+
+# -----------------------
+# Read-through cache
+# -----------------------
+# Caches derived read results (the user directory, a user's board) keyed by the
+# change_versions scope they depend on. An entry is served only while its scope's
+# version is unchanged, so a stale read is impossible as long as the version is current:
+#
+# - writes in this process call invalidate(scope) from the write helpers;
+# - writes by other processes are noticed through PRAGMA data_version, which changes on a
+#   connection whenever another connection has committed. When it does, every known
+#   version is dropped and re-read (one primary-key lookup per scope) on next use.
+#
+# Connections to a shard database carry a `namespace` attribute (the shard name): its
+# scopes and keys are kept apart from the main database's, which has scopes of the same name.
+#
+# Backends: MemoryBackend (per process, LRU + TTL) and SQLiteBackend (a cache file
+# shared by all worker processes on the host, TTL + approximate LRU).
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (version, value, expires_at)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """(version, value) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Cache shared between processes through a SQLite file (values stored as JSON).
+    Durability is irrelevant here, so the file runs with synchronous = OFF.
+    last_used is refreshed at most every `touch_interval` seconds to keep hits read-only.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries(
+        key TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """
+
+    def __init__(self, path, max_entries=4096, ttl=300.0, touch_interval=30.0, pool_size=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.pool = ConnectionPool(path, size=pool_size, pragmas={
+            "journal_mode": "WAL", "synchronous": "OFF", "busy_timeout": 2000})
+        self.pool.add_connect_hook(self._create)
+        self.evictions = 0
+
+    def _create(self, conn):
+        conn.execute(self.SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used ON cache_entries(last_used)")
+        conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT version, value, expires_at, last_used FROM cache_entries WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            if row["expires_at"] < now:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at < ?", (key, now))
+                conn.commit()
+                return None
+            if now - row["last_used"] > self.touch_interval:
+                conn.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+            return row["version"], json.loads(row["value"])
+
+    def set(self, key, version, value):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute("""
+            INSERT OR REPLACE INTO cache_entries (key, version, value, expires_at, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            """, (key, version, json.dumps(value, separators=(",", ":")), now + self.ttl, now))
+            over = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+            if over > 0:
+                conn.execute("""
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM cache_entries ORDER BY last_used LIMIT ?)
+                """, (over,))
+                self.evictions += over
+            conn.commit()
+
+    def clear(self):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM cache_entries")
+            conn.commit()
+
+    def __len__(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class ReadThroughCache:
+    """One per app (app.extensions["cache"]). See the module comment for the staleness rules."""
+
+    MAX_KNOWN_SCOPES = 10000
+
+    def __init__(self, backend):
+        self.backend = backend
+        # scope -> {namespace: version confirmed since other connections last committed}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version_reads = 0
+        self.invalidations = 0
+
+    def _check_data_version(self, conn):
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        seen = getattr(conn, "cache_data_version", None)
+        conn.cache_data_version = data_version
+        # a connection seen for the first time has no baseline: it can't vouch for anything
+        if seen != data_version:
+            with self._lock:
+                self._versions.clear()
+
+    def _version(self, conn, scope, namespace):
+        version = self._versions.get(scope, {}).get(namespace)
+        if version is None:
+            row = conn.execute("SELECT version FROM change_versions WHERE scope = ?", (scope,)).fetchone()
+            version = row[0] if row else 0
+            with self._lock:
+                if len(self._versions) >= self.MAX_KNOWN_SCOPES:
+                    self._versions.clear()
+                self._versions.setdefault(scope, {})[namespace] = version
+                self.version_reads += 1
+        return version
+
+    def get_or_load(self, conn, key, scope, loader):
+        """Return the cached value for key if scope is unchanged (as seen on conn), else loader() (and cache it)."""
+        self._check_data_version(conn)
+        namespace = getattr(conn, "namespace", "")
+        if namespace:
+            key = f"{namespace}/{key}"
+        version = self._version(conn, scope, namespace)
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = loader()
+        self.backend.set(key, version, value)
+        return value
+
+    def invalidate(self, scope=None):
+        """Forget the version of `scope` in every namespace (all scopes if None) so the next read re-checks it."""
+        with self._lock:
+            if scope is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(scope, None)
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "version_reads": self.version_reads,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            "entries": len(self.backend),
+        }
+
+
+class NullCache:
+    """CACHE_BACKEND = None (and the PostgreSQL backend): always load."""
+
+    def get_or_load(self, conn, key, scope, loader):
+        return loader()
+
+    def invalidate(self, scope=None):
+        pass
+
+    def stats(self):
+        return {}
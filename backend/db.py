@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------
+# SQLite connection pool
+# -----------------------
+# Pragmas applied to every pooled connection when it is opened.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# -----------------------
+# Instrumented connections
+# -----------------------
+# Every pooled connection reports each statement it runs to its observers, called as
+# observer(sql, parameters, seconds, locking). `parameters` is None for executemany().
+# `locking` is True for statements that had to take the write lock:
+# BEGIN IMMEDIATE/EXCLUSIVE, the first write of an implicit transaction, and COMMIT.
+# Timing covers preparing the statement and its first step (where SQLite waits for locks),
+# not fetching the remaining rows.
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return self.connection._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.connection._timed(super().executemany, sql, seq_of_parameters, many=True)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    observers = ()
+
+    def add_observer(self, observer):
+        self.observers = self.observers + (observer,)
+
+    def _timed(self, run, sql, parameters, many=False):
+        if not self.observers:
+            return run(sql, parameters)
+        was_in_transaction = self.in_transaction
+        started = time.perf_counter()
+        try:
+            return run(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            head = sql.lstrip()[:15].upper()
+            if head.startswith("BEGIN"):
+                locking = head in ("BEGIN IMMEDIATE", "BEGIN EXCLUSIVE")
+            else:
+                locking = not was_in_transaction and self.in_transaction
+            for observer in self.observers:
+                observer(sql, None if many else parameters, elapsed, locking)
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.observers or not self.in_transaction:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            elapsed = time.perf_counter() - started
+            for observer in self.observers:
+                observer("COMMIT", None, elapsed, True)
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared by all request threads.
+    Connections are opened lazily, up to `size`, and handed out one thread at a time.
+    """
+
+    def __init__(self, path, size=8, timeout=30.0, pragmas=None, cached_statements=256):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        # callables run on every new connection (tracing, instrumentation)
+        self.connect_hooks = []
+
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+
+        # stats
+        self._acquired = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def connect(self):
+        """A new connection with the pool's pragmas and hooks, owned by the caller (not pooled)."""
+        conn = sqlite3.connect(self.path,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements,
+                               factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for hook in self.connect_hooks:
+            hook(conn)
+        return conn
+
+    def acquire(self):
+        started = time.perf_counter()
+        waited = False
+        with self._cond:
+            while not self._idle and self._opened >= self.size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                # reserve the slot before connecting so other threads don't overshoot `size`
+                self._opened += 1
+                conn = None
+
+            waited_for = time.perf_counter() - started
+            self._acquired += 1
+            if waited:
+                self._waits += 1
+                self._wait_total += waited_for
+                self._wait_max = max(self._wait_max, waited_for)
+
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        # never hand a connection with an open transaction to the next request
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            conn.close()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def add_connect_hook(self, hook):
+        """Run hook(conn) on every connection, including ones already open but idle."""
+        self.connect_hooks.append(hook)
+        with self._cond:
+            for conn in self._idle:
+                hook(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "in_use": self._opened - len(self._idle),
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+            }
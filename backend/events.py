@@ -0,0 +1,198 @@
+import threading
+from collections import deque
+
+# -----------------------
+# Board events (Server-Sent Events)
+# -----------------------
+# Routes that change the board insert a small row into board_events in their own
+# transaction (repository.publish_event) and wake the broker. EventBroker polls the table from one
+# background thread, keeps the newest events in a ring buffer and wakes subscribers, so
+# an idle /events client costs a blocked generator and nothing else: no database
+# connection and no polling of its own. The table is the source of truth, which makes
+# Last-Event-ID resumable and lets every worker process see every other worker's events.
+# Under a sync server each open stream still occupies a worker thread; serve the app
+# through asgi.py (astream() waits on the event loop) or under gevent workers
+# (gunicorn -k gevent) to hold thousands of idle subscribers.
+
+EVENTS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS board_events(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        owner_id INTEGER,
+        data TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (DATETIME('now'))
+    )
+    """,
+]
+
+
+class EventBroker:
+    """Fans board_events out to /events subscribers. One per database (app.extensions["events"][shard])."""
+
+    def __init__(self, store, poll_interval=1.0, buffer_size=1024, retention=10000,
+                 keepalive=15.0, prune_every=60):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.keepalive = keepalive
+        self.prune_every = prune_every
+
+        # (id, kind, owner_id, data), oldest first
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = None
+        self._cond = threading.Condition()
+        # (loop, future) of astream() subscribers waiting for the next event
+        self._waiters = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="event-broker", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Wake the broker (starting it if needed) so a just-committed event goes out now."""
+        self.start()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        polls = 0
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                polls += 1
+                if self.retention and polls % self.prune_every == 0:
+                    self.prune()
+            except Exception as e:
+                print(f"[EVENTS ERROR] {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def poll(self):
+        """Load events committed since the last poll and wake subscribers."""
+        with self.store.session() as repo:
+            if self._last_id is None:
+                # start from the current end of the log, not its beginning
+                latest = repo.latest_event_id()
+                with self._cond:
+                    if self._last_id is None:
+                        self._last_id = latest
+            while True:
+                rows = repo.events_after(self._last_id)
+                if not rows:
+                    break
+                with self._cond:
+                    self._events.extend(rows)
+                    self._last_id = rows[-1][0]
+                    self._cond.notify_all()
+                    waiters, self._waiters = self._waiters, set()
+                for loop, future in waiters:
+                    loop.call_soon_threadsafe(_resolve, future)
+
+    def prune(self):
+        """Drop events older than the newest `retention` ones."""
+        with self.store.session() as repo, repo.transaction():
+            repo.prune_events(self._last_id - self.retention)
+
+    def _since(self, last_id):
+        """Buffered events newer than last_id, or None if the buffer no longer reaches back that far."""
+        if not self._events or self._events[0][0] > last_id + 1:
+            return None
+        newer = []
+        for event in reversed(self._events):
+            if event[0] <= last_id:
+                break
+            newer.append(event)
+        newer.reverse()
+        return newer
+
+    def stream(self, user_id, last_id=None):
+        """SSE body for one subscriber, resuming after last_id (the client's Last-Event-ID)."""
+        self.start()
+        if self._last_id is None:
+            self.poll()
+        if last_id is None or last_id > self._last_id:
+            last_id = self._last_id
+
+        yield f"retry: {int(self.poll_interval * 3000)}\n\n"
+        while True:
+            with self._cond:
+                ready = self._cond.wait_for(lambda: self._last_id > last_id, self.keepalive)
+                events = self._since(last_id) if ready else []
+                latest = self._last_id
+            if not ready:
+                yield ": keepalive\n\n"
+                continue
+            if events is None:
+                events = self._events_after(last_id)
+            if not events:
+                last_id = latest  # the missed events were pruned
+                continue
+            yield from self._frames(events, user_id)
+            last_id = events[-1][0]
+
+    async def astream(self, user_id, last_id=None):
+        """stream() for asyncio servers: an idle subscriber waits on a future, not a thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self.start()
+        if self._last_id is None:
+            await loop.run_in_executor(None, self.poll)
+        if last_id is None or last_id > self._last_id:
+            last_id = self._last_id
+
+        yield f"retry: {int(self.poll_interval * 3000)}\n\n"
+        while True:
+            with self._cond:
+                ready = self._last_id > last_id
+                if ready:
+                    events = self._since(last_id)
+                    latest = self._last_id
+                else:
+                    waiter = (loop, loop.create_future())
+                    self._waiters.add(waiter)
+            if not ready:
+                try:
+                    await asyncio.wait_for(waiter[1], self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                finally:
+                    with self._cond:
+                        self._waiters.discard(waiter)
+                continue
+            if events is None:
+                events = await loop.run_in_executor(None, self._events_after, last_id)
+            if not events:
+                last_id = latest
+                continue
+            for frame in self._frames(events, user_id):
+                yield frame
+            last_id = events[-1][0]
+
+    def _events_after(self, last_id):
+        # fell behind the ring buffer: catch up from the table
+        with self.store.session() as repo:
+            return repo.events_after(last_id)
+
+    @staticmethod
+    def _frames(events, user_id):
+        for event_id, kind, owner_id, data in events:
+            if owner_id is None or owner_id == user_id:
+                yield f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,70 @@
+"""
+Cold-start budget check for the app module.
+
+    python import_budget.py [--budget-ms 400]
+
+Imports `app` in a fresh interpreter with `-X importtime`, then builds an app with
+create_app(). Fails (exit 1) if the import plus factory call exceeds the budget, or if
+either of them touched the database file or started a thread.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import os, sys, threading, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({"DB_PATH": sys.argv[1]})
+built = time.perf_counter()
+print(round((imported - started) * 1000, 1), round((built - imported) * 1000, 1),
+      int(os.path.exists(sys.argv[1])), threading.active_count())
+"""
+
+def measure(db_path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE, db_path],
+                          cwd=here, capture_output=True, text=True, check=True)
+    import_ms, factory_ms, db_touched, threads = proc.stdout.split()
+
+    # slowest top-level imports and their direct children, by cumulative time
+    # (-X importtime writes to stderr in microseconds; nesting is shown by indentation)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("    "):
+            modules.append((int(cumulative) / 1000, name.rstrip()))
+    modules.sort(reverse=True)
+    return float(import_ms), float(factory_ms), db_touched == "1", int(threads), modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", 400)))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import_ms, factory_ms, db_touched, threads, modules = measure(os.path.join(tmp, "probe.db"))
+
+    total = import_ms + factory_ms
+    print(f"import app: {import_ms} ms, create_app(): {factory_ms} ms, budget: {args.budget_ms} ms")
+    for ms, name in modules[:10]:
+        print(f"  {ms:8.1f} ms {name}")
+
+    failures = []
+    if total > args.budget_ms:
+        failures.append(f"cold start took {total:.1f} ms (budget {args.budget_ms} ms)")
+    if db_touched:
+        failures.append("import/create_app() created the database file")
+    if threads > 1:
+        failures.append(f"import/create_app() started {threads - 1} thread(s)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
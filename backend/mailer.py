@@ -0,0 +1,121 @@
+import threading
+import time
+
+# -----------------------
+# Email outbox
+# -----------------------
+# Request handlers only insert into email_outbox (repository.enqueue_email, in their own
+# transaction) and wake the worker. OutboxWorker delivers queued rows in batches over one reused SMTP session and
+# retries failures with exponential backoff. The SMTP transport lives in smtp_transport.py
+# and is only imported when real SMTP credentials are configured.
+
+OUTBOX_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS email_outbox(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        body_text TEXT NOT NULL,
+        body_html TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+        last_error TEXT,
+        created_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+        sent_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox(next_attempt_at) WHERE status = 'pending'",
+]
+
+
+class OutboxWorker:
+    """
+    Background thread delivering email_outbox rows.
+    `transport(row)` sends one row and raises on failure (see smtp_transport.SMTPTransport).
+    Rows are claimed with a lease (next_attempt_at pushed forward) so several worker
+    processes can share one outbox, and a crashed worker's rows come back after the lease.
+    """
+
+    def __init__(self, store, transport, batch_size=20, poll_interval=5.0,
+                 max_attempts=5, backoff_base=30, backoff_max=3600, lease_seconds=120):
+        self.store = store
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Wake the worker (starting it if needed) so a freshly queued message goes out now."""
+        self.start()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.deliver_batch()
+            except Exception as e:
+                print(f"[OUTBOX ERROR] {e}")
+                delivered = 0
+            if delivered < self.batch_size:
+                # queue drained (or failing): sleep until the next poll or a notify()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                idle = getattr(self.transport, "close_if_idle", None)
+                if idle:
+                    idle()
+        close = getattr(self.transport, "close", None)
+        if close:
+            close()
+
+    def _claim(self, repo):
+        with repo.transaction(immediate=True):
+            return repo.claim_emails(self.batch_size, self.lease_seconds)
+
+    def deliver_batch(self):
+        """Claim and deliver one batch. Returns the number of rows claimed."""
+        with self.store.session() as repo:
+            rows = self._claim(repo)
+            sent, retry, failed = [], [], []
+            for row in rows:
+                try:
+                    self.transport(row)
+                    sent.append(row["id"])
+                except Exception as e:
+                    attempts = row["attempts"] + 1
+                    if attempts >= self.max_attempts:
+                        failed.append((str(e), row["id"]))
+                    else:
+                        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                        retry.append((str(e), delay, row["id"]))
+
+            if rows:
+                with repo.transaction():
+                    repo.finish_emails(sent, retry, failed)
+            return len(rows)
+
+
+def console_transport(row):
+    """Development transport: print the message instead of sending it."""
+    print(f"[DEV] Email to {row['recipient']}: {row['subject']}\n{row['body_text']}")
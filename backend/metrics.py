@@ -0,0 +1,243 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, request, has_request_context
+
+# -----------------------
+# Request and SQL metrics
+# -----------------------
+# Per-endpoint latency histograms, request/error counters, and per-request SQL statement
+# counts, SQLite time and write-lock wait, rendered in Prometheus text format at /metrics.
+# Series are keyed by endpoint name (never the raw URL) and histograms use fixed buckets,
+# so memory stays bounded however much traffic the process serves.
+#
+# With METRICS_MULTIPROC_DIR set, every worker process also writes its numbers to
+# <dir>/metrics-<pid>.json and /metrics sums the files of all workers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+SQL_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LOCK_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Request latency by endpoint.", LATENCY_BUCKETS),
+    "sqlite_statements_per_request": ("SQL statements run per request.", STATEMENT_BUCKETS),
+    "sqlite_time_per_request_seconds": ("Time spent in SQLite per request.", SQL_TIME_BUCKETS),
+    "sqlite_write_lock_wait_seconds": (
+        "Per-request time in statements that take the write lock "
+        "(BEGIN IMMEDIATE, first write of a transaction, COMMIT).", LOCK_WAIT_BUCKETS),
+}
+COUNTERS = {
+    "http_requests_total": "Requests by endpoint, method and status code.",
+    "http_request_errors_total": "Requests that raised or returned a 5xx status.",
+}
+
+
+class Metrics:
+    """Process-local metric store. One per app (app.extensions["metrics"])."""
+
+    def __init__(self, multiproc_dir=None, flush_interval=1.0):
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # (name, labels) -> value, labels being a tuple of (key, value) pairs
+        self._counters = {}
+        # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+        self._histograms = {}
+        self._last_flush = 0.0
+        # (prefix, stats function) pairs rendered as <prefix>_<field> gauges
+        self._gauge_sources = []
+
+    def init_app(self, app, pool=None):
+        app.extensions["metrics"] = self
+        if pool is not None:
+            self.add_pool(pool)
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+
+    def add_pool(self, pool, prefix="db_pool"):
+        """Time the statements of a SQLite pool's connections and report its stats."""
+        self.add_gauges(prefix, pool.stats)
+        pool.add_connect_hook(self._instrument)
+
+    def add_gauges(self, prefix, stats):
+        """Report every numeric field of stats() as a <prefix>_<field> gauge."""
+        self._gauge_sources.append((prefix, stats))
+
+    # -----------------------
+    # Recording
+    # -----------------------
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            slots = self._histograms.get(key)
+            if slots is None:
+                slots = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    slots[i] += 1
+                    break
+            else:
+                slots[len(buckets)] += 1
+            slots[-1] += value
+
+    def _instrument(self, conn):
+        conn.add_observer(self._observe_statement)
+
+    def _observe_statement(self, sql, parameters, seconds, locking):
+        # statements outside a request (outbox worker, CLI) are not attributed; writer intents
+        # run in their request's context (app.write_intent) and count towards it
+        if not has_request_context():
+            return
+        stats = g.get("sql_stats")
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += seconds
+            if locking:
+                stats[2] += seconds
+
+    def charge(self, statements, seconds, lock_seconds):
+        """Add SQL run for the current request outside it (its writer batch's, see writer.py)."""
+        stats = g.get("sql_stats")
+        if stats is not None:
+            stats[0] += statements
+            stats[1] += seconds
+            stats[2] += lock_seconds
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_stats = [0, 0.0, 0.0]
+
+    def _record_status(self, response):
+        g.response_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        started = g.pop("request_started", None)
+        if started is None:
+            return
+        # streamed responses get here once the body has been sent
+        elapsed = time.perf_counter() - started
+        statements, sql_seconds, lock_seconds = g.pop("sql_stats")
+        status = 500 if exc is not None else g.pop("response_status", 500)
+        endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+        labels = (("endpoint", endpoint), ("method", request.method))
+
+        self.observe("http_request_duration_seconds", labels, elapsed)
+        self.inc("http_requests_total", labels + (("status", str(status)),))
+        if status >= 500:
+            self.inc("http_request_errors_total", labels)
+        self.observe("sqlite_statements_per_request", labels, statements)
+        self.observe("sqlite_time_per_request_seconds", labels, sql_seconds)
+        if lock_seconds:
+            self.observe("sqlite_write_lock_wait_seconds", labels, lock_seconds)
+
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # -----------------------
+    # Snapshots and multi-process mode
+    # -----------------------
+    def snapshot(self):
+        gauges = {}
+        for prefix, stats in self._gauge_sources:
+            for field, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}_{field}"] = value
+        with self._lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), list(slots)] for (name, labels), slots in self._histograms.items()],
+                "gauges": gauges,
+            }
+
+    def flush(self):
+        """Write this process's snapshot to the multi-process directory."""
+        self._last_flush = time.monotonic()
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = os.path.join(self.multiproc_dir, f"metrics-{os.getpid()}.json")
+        fd, tmp = tempfile.mkstemp(dir=self.multiproc_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _collect(self):
+        """Snapshots to render: this process only, or every worker's file in multi-process mode."""
+        if not self.multiproc_dir:
+            return [(None, self.snapshot())]
+        self.flush()
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, "metrics-*.json"))):
+            pid = os.path.basename(path)[len("metrics-"):-len(".json")]
+            try:
+                with open(path) as f:
+                    snapshots.append((pid, json.load(f)))
+            except (OSError, ValueError):
+                continue  # worker mid-write or gone
+        return snapshots
+
+    # -----------------------
+    # Prometheus text format
+    # -----------------------
+    def render(self):
+        counters, histograms, gauges = {}, {}, {}
+        for pid, snap in self._collect():
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, slots in snap["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.get(key)
+                histograms[key] = slots if merged is None else [a + b for a, b in zip(merged, slots)]
+            # gauges are per process; label them by pid when merging workers
+            pid_labels = (("pid", pid),) if pid else ()
+            for name, value in snap["gauges"].items():
+                gauges.setdefault(name, []).append((pid_labels, value))
+
+        lines = []
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (metric, labels), slots in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, slots):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                cumulative += slots[len(buckets)]
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(slots[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        for name, values in sorted(gauges.items()):
+            lines += [f"# HELP {name} {name.replace('_', ' ')}.", f"# TYPE {name} gauge"]
+            for labels, value in values:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,307 @@
+# -----------------------
+# Versioned schema migrations
+# -----------------------
+# Each migration is (version, name, steps). A step is either a SQL string or a
+# callable taking the connection. Migrations run in order, each in its own
+# transaction, and the applied version is recorded in `schema_version`.
+# Data too large to rewrite under one write lock is not migrated here: see e.g. the
+# integer timestamp backfill in timestamps.py.
+# Never edit a migration that has shipped; append a new one instead.
+from rollup import ROLLUP_SCHEMA, rebuild_daily_rollup
+from mailer import OUTBOX_SCHEMA
+from events import EVENTS_SCHEMA
+from resets import ATTEMPTS_SCHEMA
+from timestamps import epoch_columns_schema, epoch_indexes, OPEN_ENTRIES_BACKFILL, BACKFILL_JOB_SCHEMA
+from tenancy import TEAMS_SCHEMA
+from search import SEARCH_SCHEMA
+
+
+def _base_schema():
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS users(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            full_name TEXT,
+            email TEXT UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (DATETIME('now'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tasks(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            priority TEXT NOT NULL DEFAULT 'medium',
+            estimated_duration REAL,
+            day TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'todo',
+            user_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+            updated_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS time_entries(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            duration_minutes INTEGER,
+            work_date TEXT NOT NULL,
+            FOREIGN KEY (task_id) REFERENCES tasks(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS password_resets(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            otp TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+            expires_at TEXT NOT NULL,
+            used INTEGER DEFAULT 0,
+            FOREIGN KEY (email) REFERENCES users(email)
+        )
+        """,
+    ]
+
+def _hot_path_indexes():
+    return [
+        # Persisted sort key for the board ordering (todo, inprogress, done).
+        # A virtual generated column is stored only in the index built on it.
+        """
+        ALTER TABLE tasks ADD COLUMN status_rank INTEGER
+        GENERATED ALWAYS AS (CASE status
+            WHEN 'todo' THEN 1
+            WHEN 'inprogress' THEN 2
+            WHEN 'done' THEN 3
+        END) VIRTUAL
+        """,
+        # get_tasks(): WHERE user_id = ? ORDER BY status_rank, created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created ON tasks(user_id, status_rank, created_at DESC)",
+        # /timesheet and /report/weekly: WHERE user_id = ? AND work_date BETWEEN ? AND ?
+        # (duration_minutes included so the weekly sum is answered from the index alone)
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_user_date ON time_entries(user_id, work_date, duration_minutes)",
+        # /dashboard: every user's entries for the week
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_date ON time_entries(work_date)",
+        # timer_start / timer_stop / move_task: the open timer for a task
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_open ON time_entries(task_id, user_id) WHERE end_time IS NULL",
+        # /forgot-password and /verify-otp
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets(email, created_at)",
+    ]
+
+def _weekly_report_snapshot():
+    # Monday of the week containing a date or timestamp (matches week_bounds())
+    week_of = "DATE({}, '-6 days', 'weekday 1')"
+    return [
+        # /report/weekly counts a user's tasks created in a week, and how many are done
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks(user_id, created_at, status)",
+        """
+        CREATE TABLE IF NOT EXISTS weekly_report_snapshot(
+            user_id INTEGER NOT NULL,
+            week_start TEXT NOT NULL,
+            hours_worked REAL NOT NULL,
+            tasks_total INTEGER NOT NULL,
+            tasks_done INTEGER NOT NULL,
+            completion_rate REAL NOT NULL,
+            rating REAL NOT NULL,
+            computed_at TEXT NOT NULL DEFAULT (DATETIME('now')),
+            PRIMARY KEY (user_id, week_start)
+        ) WITHOUT ROWID
+        """,
+        # Any write that can change a week's numbers drops that week's snapshot
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_snapshot_insert
+        AFTER INSERT ON tasks
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE user_id = NEW.user_id AND week_start = {week_of.format("NEW.created_at")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_snapshot_update
+        AFTER UPDATE OF status, user_id, created_at ON tasks
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE (user_id = OLD.user_id AND week_start = {week_of.format("OLD.created_at")})
+                OR (user_id = NEW.user_id AND week_start = {week_of.format("NEW.created_at")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_snapshot_delete
+        AFTER DELETE ON tasks
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE user_id = OLD.user_id AND week_start = {week_of.format("OLD.created_at")};
+        END
+        """,
+        # Logged minutes reach the report through daily_time_rollup
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_snapshot_insert
+        AFTER INSERT ON daily_time_rollup
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE user_id = NEW.user_id AND week_start = {week_of.format("NEW.work_date")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_snapshot_update
+        AFTER UPDATE ON daily_time_rollup
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE user_id = NEW.user_id AND week_start = {week_of.format("NEW.work_date")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_snapshot_delete
+        AFTER DELETE ON daily_time_rollup
+        BEGIN
+            DELETE FROM weekly_report_snapshot
+             WHERE user_id = OLD.user_id AND week_start = {week_of.format("OLD.work_date")};
+        END
+        """,
+    ]
+
+def _bump(scope):
+    return f"""
+            INSERT INTO change_versions (scope, version) VALUES ({scope}, 1)
+            ON CONFLICT(scope) DO UPDATE SET version = version + 1, changed_at = DATETIME('now');"""
+
+def _change_versions():
+    # Per-scope counters behind the ETags of /api/tasks ("tasks:<user_id>") and /api/users ("users").
+    # Triggers bump them on every write, so no write path can forget to.
+    bump = _bump
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS change_versions(
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (DATETIME('now'))
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_version_insert
+        AFTER INSERT ON tasks
+        BEGIN{bump("'tasks:' || NEW.user_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_version_update
+        AFTER UPDATE ON tasks
+        BEGIN{bump("'tasks:' || OLD.user_id")}{bump("'tasks:' || NEW.user_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_version_delete
+        AFTER DELETE ON tasks
+        BEGIN{bump("'tasks:' || OLD.user_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_insert
+        AFTER INSERT ON users
+        BEGIN{bump("'users'")}
+        END
+        """,
+        # /api/tasks rows carry the owner's username and full_name
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_update
+        AFTER UPDATE OF username, full_name ON users
+        BEGIN{bump("'users'")}{bump("'tasks:' || NEW.id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_delete
+        AFTER DELETE ON users
+        BEGIN{bump("'users'")}
+        END
+        """,
+    ]
+
+def _password_reset_hygiene():
+    return [
+        # /verify-otp: WHERE email = ? AND otp = ? AND used = 0. Only live rows are indexed,
+        # which keeps the index small however many spent rows await the janitor.
+        "DROP INDEX IF EXISTS idx_password_resets_email",
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_otp ON password_resets(email, otp) WHERE used = 0",
+        # ResetJanitor: WHERE expires_at <= now
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_expires ON password_resets(expires_at)",
+    ] + ATTEMPTS_SCHEMA
+
+def _teams():
+    return TEAMS_SCHEMA + [
+        # moving a user changes which team directory (and board) they appear in
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_team
+        AFTER UPDATE OF team_id ON users
+        BEGIN{_bump("'users'")}{_bump("'tasks:' || NEW.id")}
+        END
+        """,
+    ]
+
+MIGRATIONS = [
+    (1, "base schema", _base_schema()),
+    (2, "hot path indexes", _hot_path_indexes()),
+    (3, "daily time rollup", ROLLUP_SCHEMA + [rebuild_daily_rollup]),
+    (4, "weekly report snapshot", _weekly_report_snapshot()),
+    (5, "email outbox", OUTBOX_SCHEMA),
+    (6, "board events", EVENTS_SCHEMA),
+    (7, "change versions", _change_versions()),
+    (8, "password reset hygiene", _password_reset_hygiene()),
+    (9, "integer timestamp columns", epoch_columns_schema()),
+    (10, "integer timestamp indexes", [OPEN_ENTRIES_BACKFILL] + epoch_indexes()),
+    (11, "teams", _teams()),
+    (12, "task search", SEARCH_SCHEMA),
+    (13, "background jobs", BACKFILL_JOB_SCHEMA),
+]
+
+def schema_version(conn):
+    row = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+    return row[0]
+
+def migrate(conn, migrations=None):
+    """
+    Bring the database up to the latest schema version.
+    Safe to call on every startup and from several processes at once.
+    Returns the list of versions that were applied.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version(
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT (DATETIME('now'))
+    )
+    """)
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = []
+    if schema_version(conn) >= migrations[-1][0]:
+        return applied
+
+    for version, name, steps in migrations:
+        if schema_version(conn) >= version:
+            continue
+        # take the write lock first, then re-check: another worker may have migrated already
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
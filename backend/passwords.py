@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# -----------------------
+# Password hashing
+# -----------------------
+# Stored formats:
+#   scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>       (default)
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+#   <salt hex>$<sha256 hex>                         (legacy; verified, then upgraded)
+# hashlib's scrypt and pbkdf2_hmac release the GIL, so PasswordHasher runs them on a small
+# thread pool: at most `workers` hashes burn CPU at once and at most `max_queue` more may
+# wait, beyond which callers get HasherBusy (a 503) instead of piling up. A hash that takes
+# longer than `timeout` (queue wait included) also ends in HasherBusy.
+
+SCRYPT_DEFAULTS = {"n": 2 ** 14, "r": 8, "p": 1}
+PBKDF2_DEFAULT_ITERATIONS = 600000
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=32)
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+def hash_password(password, scheme="scrypt", n=None, r=None, p=None, iterations=None):
+    """Hash in the calling thread. Prefer PasswordHasher.hash() in request handlers."""
+    salt = secrets.token_bytes(16)
+    if scheme == "scrypt":
+        n, r, p = n or SCRYPT_DEFAULTS["n"], r or SCRYPT_DEFAULTS["r"], p or SCRYPT_DEFAULTS["p"]
+        return f"scrypt${n}${r}${p}${salt.hex()}${_scrypt(password, salt, n, r, p).hex()}"
+    if scheme == "pbkdf2_sha256":
+        iterations = iterations or PBKDF2_DEFAULT_ITERATIONS
+        return f"pbkdf2_sha256${iterations}${salt.hex()}${_pbkdf2(password, salt, iterations).hex()}"
+    raise ValueError(f"Unknown password scheme: {scheme!r}")
+
+def verify_password(stored_password, provided_password):
+    if not stored_password or '$' not in stored_password:
+        return False
+    parts = stored_password.split('$')
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            computed = _scrypt(provided_password, bytes.fromhex(parts[4]), n, r, p).hex()
+            return hmac.compare_digest(computed, parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            computed = _pbkdf2(provided_password, bytes.fromhex(parts[2]), int(parts[1])).hex()
+            return hmac.compare_digest(computed, parts[3])
+    except ValueError:
+        return False
+    # legacy salt$sha256
+    salt, hashed = stored_password.split('$', 1)
+    return hmac.compare_digest(hashlib.sha256((salt + provided_password).encode()).hexdigest(), hashed)
+
+def needs_rehash(stored_password, scheme="scrypt", n=None, r=None, p=None, iterations=None):
+    """True unless stored_password already uses `scheme` with these cost parameters."""
+    parts = (stored_password or "").split('$')
+    if scheme == "scrypt":
+        wanted = [str(n or SCRYPT_DEFAULTS["n"]), str(r or SCRYPT_DEFAULTS["r"]), str(p or SCRYPT_DEFAULTS["p"])]
+        return not (parts[0] == "scrypt" and len(parts) == 6 and parts[1:4] == wanted)
+    if scheme == "pbkdf2_sha256":
+        return not (parts[0] == "pbkdf2_sha256" and len(parts) == 4
+                    and parts[1] == str(iterations or PBKDF2_DEFAULT_ITERATIONS))
+    return True
+
+
+class PasswordHasher:
+    """One per app (app.extensions["hasher"]). Threads start with the first hash."""
+
+    def __init__(self, scheme="scrypt", params=None, workers=2, max_queue=32, timeout=10.0):
+        self.scheme = scheme
+        self.params = dict(params or {})
+        self.workers = workers
+        self.timeout = timeout
+        # running + waiting jobs
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+        self.rehashed = 0
+        self._dummy_hash = None
+
+    def _submit(self, fn, *args, block=True):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            if not block:
+                return None
+            raise HasherBusy("Password hashing queue is full")
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hasher")
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # drop it if it is still queued; a running hash finishes and frees its slot then
+            future.cancel()
+            self.timed_out += 1
+            raise HasherBusy("Password hashing timed out") from None
+
+    def hash(self, password):
+        return self._result(self._submit(hash_password, password, self.scheme, *self._param_args()))
+
+    def verify(self, stored_password, provided_password):
+        return self._result(self._submit(verify_password, stored_password, provided_password))
+
+    def verify_dummy(self, provided_password):
+        """
+        Take as long as verify() against a current hash, then fail: login calls it for unknown
+        usernames so the response time doesn't tell which usernames exist.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(16))
+        self.verify(self._dummy_hash, provided_password)
+        return False
+
+    def _param_args(self):
+        return (self.params.get("n"), self.params.get("r"), self.params.get("p"), self.params.get("iterations"))
+
+    def needs_rehash(self, stored_password):
+        return needs_rehash(stored_password, self.scheme, *self._param_args())
+
+    def rehash_later(self, store, user_id, old_hash, password):
+        """
+        Upgrade a user's hash in the background after a successful login. Skipped when the
+        queue is full (the next login retries) or if the hash changed meanwhile.
+        """
+        def upgrade():
+            new_hash = hash_password(password, self.scheme, *self._param_args())
+            with store.session() as repo, repo.transaction():
+                replaced = repo.replace_password_hash(user_id, old_hash, new_hash)
+            if replaced:
+                self.rehashed += 1
+        self._submit(upgrade, block=False)
+
+    def stats(self):
+        return {"workers": self.workers, "rejected": self.rejected, "timed_out": self.timed_out,
+                "rehashed": self.rehashed}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
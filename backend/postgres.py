@@ -0,0 +1,857 @@
+import json
+import threading
+from contextlib import contextmanager
+
+from repository import TASK_COLUMNS, task_page
+from tenancy import DEFAULT_TEAM_ID
+from timestamps import stamp, epoch_day
+
+# -----------------------
+# PostgreSQL storage backend
+# -----------------------
+# STORAGE_BACKEND = "postgresql": one database at DATABASE_URL, reached through a
+# psycopg_pool.ConnectionPool (psycopg 3). Neither is imported unless this backend is
+# configured, and the pool (with its maintenance threads) opens on first use.
+#
+# The schema mirrors the SQLite one column for column, so rows look the same to the
+# routes and templates: timestamp and date columns are loaded as the same
+# 'YYYY-MM-DD HH:MM:SS' / 'YYYY-MM-DD' text (DateStyle ISO, the server default), and the
+# integer twins (created_ts, start_ts, work_day, ...) and status_rank are stored generated
+# columns. Differences that follow from having real row locks and a planner:
+#   - writers don't queue behind one database-wide lock; transaction(immediate=True) is a no-op;
+#   - multi-row work is one set-based statement (unnest() arrays, data-modifying CTEs),
+#     and the outbox is claimed with FOR UPDATE SKIP LOCKED;
+#   - change_versions and daily_time_rollup are maintained by statement-level triggers
+#     over transition tables (one upsert per statement, not per row);
+#   - the weekly report is computed on each request (no snapshot table);
+#   - time entry exports stream from a server-side cursor.
+# Behind PgBouncer in transaction pooling mode, set PG_PREPARE_THRESHOLD to None.
+
+# Wall clock in UTC, to the second (what SQLite's DATETIME('now') returns)
+UTC_NOW = "date_trunc('second', now() AT TIME ZONE 'UTC')"
+
+# pg_advisory_xact_lock key held while migrating, so workers starting together take turns
+MIGRATION_LOCK = 7413
+
+
+def _schema():
+    epoch = "EXTRACT(EPOCH FROM {})::bigint"
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS teams(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            slug TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            shard TEXT,
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW}
+        )
+        """,
+        # first row of a new table: id 1 (DEFAULT_TEAM_ID)
+        "INSERT INTO teams (slug, name) VALUES ('default', 'Default team') ON CONFLICT (slug) DO NOTHING",
+        f"""
+        CREATE TABLE IF NOT EXISTS users(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            full_name TEXT,
+            email TEXT UNIQUE,
+            password_hash TEXT NOT NULL,
+            team_id BIGINT NOT NULL DEFAULT {DEFAULT_TEAM_ID} REFERENCES teams(id),
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW}
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_users_team ON users(team_id)",
+        f"""
+        CREATE TABLE IF NOT EXISTS tasks(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            priority TEXT NOT NULL DEFAULT 'medium',
+            estimated_duration DOUBLE PRECISION,
+            day TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'todo',
+            user_id BIGINT NOT NULL REFERENCES users(id),
+            team_id BIGINT NOT NULL DEFAULT {DEFAULT_TEAM_ID},
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW},
+            updated_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW},
+            status_rank SMALLINT GENERATED ALWAYS AS (CASE status
+                WHEN 'todo' THEN 1
+                WHEN 'inprogress' THEN 2
+                WHEN 'done' THEN 3
+            END) STORED,
+            created_ts BIGINT GENERATED ALWAYS AS ({epoch.format("created_at")}) STORED,
+            updated_ts BIGINT GENERATED ALWAYS AS ({epoch.format("updated_at")}) STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created_ts ON tasks(user_id, status_rank, created_ts DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_created_ts ON tasks(user_id, created_ts) INCLUDE (status)",
+        # task_id has no foreign key: as with SQLite (foreign keys off), logged time outlives its task
+        f"""
+        CREATE TABLE IF NOT EXISTS time_entries(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            task_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL REFERENCES users(id),
+            start_time TIMESTAMP(0) NOT NULL,
+            end_time TIMESTAMP(0),
+            duration_minutes INTEGER,
+            work_date DATE NOT NULL,
+            start_ts BIGINT GENERATED ALWAYS AS ({epoch.format("start_time")}) STORED,
+            end_ts BIGINT GENERATED ALWAYS AS ({epoch.format("end_time")}) STORED,
+            work_day INTEGER GENERATED ALWAYS AS (work_date - DATE '1970-01-01') STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_user_date ON time_entries(user_id, work_date) INCLUDE (duration_minutes)",
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_date ON time_entries(work_date)",
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_open ON time_entries(task_id, user_id) WHERE end_time IS NULL",
+        f"""
+        CREATE TABLE IF NOT EXISTS password_resets(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            email TEXT NOT NULL,
+            otp TEXT NOT NULL,
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW},
+            expires_at TIMESTAMP(0) NOT NULL,
+            used SMALLINT NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_otp ON password_resets(email, otp) WHERE used = 0",
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_expires ON password_resets(expires_at)",
+        """
+        CREATE TABLE IF NOT EXISTS otp_attempts(
+            email TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL,
+            first_failed_at TIMESTAMP(0) NOT NULL,
+            locked_until TIMESTAMP(0)
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS email_outbox(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body_text TEXT NOT NULL,
+            body_html TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW},
+            last_error TEXT,
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW},
+            sent_at TIMESTAMP(0)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox(next_attempt_at) WHERE status = 'pending'",
+        f"""
+        CREATE TABLE IF NOT EXISTS board_events(
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            kind TEXT NOT NULL,
+            owner_id BIGINT,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW}
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_time_rollup(
+            user_id BIGINT NOT NULL,
+            work_date DATE NOT NULL,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, work_date)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_daily_time_rollup_date ON daily_time_rollup(work_date)",
+        f"""
+        CREATE TABLE IF NOT EXISTS change_versions(
+            scope TEXT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            changed_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW}
+        )
+        """,
+    ] + _triggers()
+
+def _triggers():
+    return [
+        # scopes are upserted in sorted order so concurrent statements lock them in the same order
+        f"""
+        CREATE OR REPLACE FUNCTION bump_change_versions(scopes TEXT[]) RETURNS void LANGUAGE sql AS $$
+            INSERT INTO change_versions AS v (scope, version)
+            SELECT DISTINCT s.scope, 1 FROM unnest(scopes) AS s(scope) ORDER BY s.scope
+            ON CONFLICT (scope) DO UPDATE SET version = v.version + 1, changed_at = {UTC_NOW}
+        $$
+        """,
+        """
+        CREATE OR REPLACE FUNCTION tasks_bump_versions() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM bump_change_versions(ARRAY(SELECT 'tasks:' || user_id FROM new_rows));
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM bump_change_versions(ARRAY(SELECT 'tasks:' || user_id FROM old_rows
+                                                   UNION SELECT 'tasks:' || user_id FROM new_rows));
+            ELSE
+                PERFORM bump_change_versions(ARRAY(SELECT 'tasks:' || user_id FROM old_rows));
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        CREATE TRIGGER trg_tasks_version_insert AFTER INSERT ON tasks
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_versions()
+        """,
+        """
+        CREATE TRIGGER trg_tasks_version_update AFTER UPDATE ON tasks
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_versions()
+        """,
+        """
+        CREATE TRIGGER trg_tasks_version_delete AFTER DELETE ON tasks
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION tasks_bump_versions()
+        """,
+        # the directory and the boards (which show the owner's name) change with a user's
+        # name or team; password and email changes show nowhere
+        """
+        CREATE OR REPLACE FUNCTION users_bump_versions() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM bump_change_versions(ARRAY(SELECT 'users' FROM new_rows LIMIT 1));
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM bump_change_versions(ARRAY(
+                    SELECT unnest(ARRAY['users', 'tasks:' || n.id])
+                      FROM old_rows o JOIN new_rows n ON n.id = o.id
+                     WHERE (n.username, n.full_name, n.team_id) IS DISTINCT FROM (o.username, o.full_name, o.team_id)));
+            ELSE
+                PERFORM bump_change_versions(ARRAY(SELECT 'users' FROM old_rows LIMIT 1));
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        CREATE TRIGGER trg_users_version_insert AFTER INSERT ON users
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_bump_versions()
+        """,
+        """
+        CREATE TRIGGER trg_users_version_update AFTER UPDATE ON users
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_bump_versions()
+        """,
+        """
+        CREATE TRIGGER trg_users_version_delete AFTER DELETE ON users
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION users_bump_versions()
+        """,
+        # daily_time_rollup: take the statement's old rows out and put its new rows in,
+        # one grouped statement each
+        """
+        CREATE OR REPLACE FUNCTION time_entries_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE daily_time_rollup r
+                   SET minutes = r.minutes - o.minutes, entry_count = r.entry_count - o.entries
+                  FROM (SELECT user_id, work_date, SUM(duration_minutes) AS minutes, COUNT(*) AS entries
+                          FROM old_rows WHERE duration_minutes IS NOT NULL
+                         GROUP BY user_id, work_date) o
+                 WHERE r.user_id = o.user_id AND r.work_date = o.work_date;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO daily_time_rollup AS r (user_id, work_date, minutes, entry_count)
+                SELECT user_id, work_date, SUM(duration_minutes), COUNT(*)
+                  FROM new_rows WHERE duration_minutes IS NOT NULL
+                 GROUP BY user_id, work_date
+                 ORDER BY user_id, work_date
+                ON CONFLICT (user_id, work_date) DO UPDATE
+                   SET minutes = r.minutes + excluded.minutes,
+                       entry_count = r.entry_count + excluded.entry_count;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        """
+        CREATE TRIGGER trg_time_entries_rollup_insert AFTER INSERT ON time_entries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup()
+        """,
+        """
+        CREATE TRIGGER trg_time_entries_rollup_update AFTER UPDATE ON time_entries
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup()
+        """,
+        """
+        CREATE TRIGGER trg_time_entries_rollup_delete AFTER DELETE ON time_entries
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup()
+        """,
+    ]
+
+# Task search (search.py's counterpart): title words weigh more than description words.
+# Queries repeat this expression verbatim so the planner uses the expression index.
+SEARCH_VECTOR = ("(setweight(to_tsvector('simple', title), 'A')"
+                 " || setweight(to_tsvector('simple', coalesce(description, '')), 'B'))")
+
+def _search():
+    return [f"CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN ({SEARCH_VECTOR})"]
+
+# Same (version, name, steps) shape as migrations.MIGRATIONS; versions are numbered separately
+MIGRATIONS = [
+    (1, "schema", _schema()),
+    (2, "task search", _search()),
+]
+
+def schema_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version").fetchone()["version"]
+
+def migrate(conn, migrations=None):
+    """
+    Bring the database up to the latest schema version. Safe to call from several
+    processes at once. Returns the list of versions that were applied.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS schema_version(
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP(0) NOT NULL DEFAULT {UTC_NOW}
+    )
+    """)
+    conn.commit()
+
+    applied = []
+    if schema_version(conn) >= migrations[-1][0]:
+        conn.rollback()
+        return applied
+
+    for version, name, steps in migrations:
+        # take the lock first, then re-check: another worker may have migrated already
+        conn.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def _configure(conn):
+    # timestamp and date columns come back as text, like the SQLite backend's
+    from psycopg.types.string import TextLoader
+    conn.adapters.register_loader("timestamp", TextLoader)
+    conn.adapters.register_loader("date", TextLoader)
+
+
+class PostgresStore:
+    """A PostgreSQL database behind a psycopg_pool.ConnectionPool (opened on first use)."""
+
+    backend = "postgresql"
+
+    def __init__(self, conninfo, min_size=1, max_size=8, timeout=30.0, prepare_threshold=5):
+        self.conninfo = conninfo
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.prepare_threshold = prepare_threshold
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from psycopg.rows import dict_row
+                    from psycopg_pool import ConnectionPool
+                    self._pool = ConnectionPool(
+                        self.conninfo, min_size=self.min_size, max_size=self.max_size,
+                        timeout=self.timeout, configure=_configure, name="taskboard", open=True,
+                        kwargs={"row_factory": dict_row, "prepare_threshold": self.prepare_threshold})
+        return self._pool
+
+    def acquire(self):
+        return self.pool.getconn()
+
+    def release(self, conn):
+        # reads leave a transaction open; end it here rather than have the pool warn about each one
+        from psycopg.pq import TransactionStatus
+        if conn.info.transaction_status == TransactionStatus.INTRANS:
+            conn.rollback()
+        self.pool.putconn(conn)
+
+    def connect(self):
+        """A connection outside the pool, for a thread that keeps its own (the caller closes it)."""
+        import psycopg
+        from psycopg.rows import dict_row
+        conn = psycopg.connect(self.conninfo, row_factory=dict_row, prepare_threshold=self.prepare_threshold)
+        _configure(conn)
+        return conn
+
+    def repository(self, conn):
+        return PostgresRepository(conn)
+
+    @contextmanager
+    def session(self):
+        conn = self.acquire()
+        try:
+            yield PostgresRepository(conn)
+        finally:
+            self.release(conn)
+
+    def prepare(self):
+        with self.session() as repo:
+            migrate(repo.conn)
+
+    def stats(self):
+        return self._pool.get_stats() if self._pool is not None else {}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
+
+class PostgresRepository:
+    """Same methods, arguments and row shapes as repository.SQLiteRepository."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # rows are locked as they are written: there is no database-wide lock to take up front
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    @contextmanager
+    def savepoint(self):
+        """Nested scope inside transaction(): an exception undoes only the writes made within it."""
+        self.conn.execute("SAVEPOINT nested")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK TO SAVEPOINT nested")
+            raise
+        finally:
+            self.conn.execute("RELEASE SAVEPOINT nested")
+
+    def _one(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+    # -----------------------
+    # Users and teams
+    # -----------------------
+    def user_by_username(self, username):
+        return self._one("SELECT * FROM users WHERE username = %s", (username,))
+
+    def user_by_email(self, email):
+        return self._one("SELECT * FROM users WHERE email = %s", (email,))
+
+    def user_team_id(self, user_id):
+        row = self._one("SELECT team_id FROM users WHERE id = %s", (user_id,))
+        return row["team_id"] if row else None
+
+    def user_exists(self, username, email):
+        return self._one("SELECT id FROM users WHERE username = %s OR email = %s", (username, email)) is not None
+
+    def create_user(self, username, full_name, email, password_hash, team_id):
+        return self._one("""
+        INSERT INTO users (username, full_name, email, password_hash, team_id) VALUES (%s, %s, %s, %s, %s)
+        RETURNING id, username, full_name, team_id
+        """, (username, full_name, email, password_hash, team_id))
+
+    def set_password(self, email, password_hash):
+        self.conn.execute("UPDATE users SET password_hash = %s WHERE email = %s", (password_hash, email))
+
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        cur = self.conn.execute("UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                                (new_hash, user_id, old_hash))
+        return cur.rowcount > 0
+
+    def team_members(self, team_id):
+        return self.conn.execute("SELECT id, username, full_name FROM users WHERE team_id = %s ORDER BY id",
+                                 (team_id,)).fetchall()
+
+    def set_user_team(self, user_id, team_id):
+        self.conn.execute("UPDATE users SET team_id = %s WHERE id = %s", (team_id, user_id))
+
+    def team_by_slug(self, slug):
+        return self._one("SELECT * FROM teams WHERE slug = %s", (slug,))
+
+    def team_shard(self, team_id):
+        row = self._one("SELECT shard FROM teams WHERE id = %s", (team_id,))
+        return row["shard"] if row else None
+
+    def create_team(self, slug, name, shard=None):
+        return self._one("INSERT INTO teams (slug, name, shard) VALUES (%s, %s, %s) RETURNING id",
+                         (slug, name, shard))["id"]
+
+    def mirror_user(self, user):
+        self.conn.execute("""
+        INSERT INTO users (id, username, full_name, password_hash, team_id) VALUES (%s, %s, %s, '!', %s)
+        ON CONFLICT (id) DO UPDATE SET
+            username = excluded.username, full_name = excluded.full_name, team_id = excluded.team_id
+        """, (user["id"], user["username"], user["full_name"], user["team_id"]))
+
+    def delete_user(self, user_id):
+        self.conn.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+    def has_board_data(self, user_id):
+        return self._one("""
+        SELECT EXISTS(SELECT 1 FROM tasks WHERE user_id = %s)
+            OR EXISTS(SELECT 1 FROM time_entries WHERE user_id = %s) AS found
+        """, (user_id, user_id))["found"]
+
+    def move_user_tasks(self, user_id, team_id):
+        self.conn.execute("UPDATE tasks SET team_id = %s WHERE user_id = %s", (team_id, user_id))
+
+    def change_version(self, scope):
+        return self._one("SELECT version, changed_at FROM change_versions WHERE scope = %s", (scope,))
+
+    # -----------------------
+    # Tasks
+    # -----------------------
+    def add_task(self, title, description, priority, estimated_duration, day, user_id, team_id):
+        return self._one("""
+        INSERT INTO tasks (title, description, priority, estimated_duration, day, user_id, team_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        RETURNING id, user_id
+        """, (title, description, priority, estimated_duration, day, user_id, team_id))
+
+    def add_tasks(self, rows):
+        """One INSERT for all rows (column arrays through unnest()); ids are drawn up front to keep input order."""
+        if not rows:
+            return []
+        ids = [r["id"] for r in self.conn.execute(
+            "SELECT nextval(pg_get_serial_sequence('tasks', 'id')) AS id FROM generate_series(1, %s)",
+            (len(rows),))]
+        columns = [list(column) for column in zip(*rows)]
+        self.conn.execute("""
+        INSERT INTO tasks (id, title, description, priority, estimated_duration, day, user_id, team_id)
+        SELECT * FROM unnest(%s::bigint[], %s::text[], %s::text[], %s::text[], %s::float8[], %s::text[],
+                             %s::bigint[], %s::bigint[])
+        """, [ids] + columns)
+        return ids
+
+    def board(self, user_id):
+        return [dict(row) for row in self.conn.execute("""
+        SELECT tasks.*, users.username, users.full_name
+        FROM tasks
+        JOIN users ON users.id = tasks.user_id
+        WHERE tasks.user_id = %s
+        ORDER BY tasks.status_rank, tasks.created_ts DESC
+        """, (user_id,))]
+
+    def task_page(self, user_id, filters, cursor=None, limit=100):
+        return task_page(self.conn, user_id, filters, cursor, limit, param="%s")
+
+    def search_tasks(self, user_id, terms, limit, offset=0):
+        query = " & ".join(f"{term}:*" for term in terms)
+        return [dict(row) for row in self.conn.execute(f"""
+        SELECT {TASK_COLUMNS}
+        FROM tasks
+        JOIN users ON users.id = tasks.user_id
+        WHERE {SEARCH_VECTOR} @@ to_tsquery('simple', %s) AND tasks.user_id = %s
+        ORDER BY ts_rank({SEARCH_VECTOR}, to_tsquery('simple', %s)) DESC, tasks.id DESC
+        LIMIT %s OFFSET %s
+        """, (query, user_id, query, limit, offset))]
+
+    def team_task(self, task_id, team_id):
+        return self._one("SELECT id, user_id FROM tasks WHERE id = %s AND team_id = %s", (task_id, team_id))
+
+    def rename_task(self, task_id, team_id, title, now):
+        return self._one("UPDATE tasks SET title = %s, updated_at = %s WHERE id = %s AND team_id = %s RETURNING *",
+                         (title, stamp(now)[0], task_id, team_id))
+
+    def delete_task(self, task_id, team_id):
+        return self._one("DELETE FROM tasks WHERE id = %s AND team_id = %s RETURNING *", (task_id, team_id))
+
+    def move_task(self, task_id, new_status, team_id, now):
+        now, now_ts = stamp(now)
+        moved = self._one("""
+        UPDATE tasks SET status = %s, updated_at = %s
+        WHERE id = %s AND team_id = %s
+        RETURNING *
+        """, (new_status, now, task_id, team_id))
+        closed = []
+        if moved and new_status == "done":
+            closed = self.conn.execute("""
+            UPDATE time_entries
+               SET end_time = %s, duration_minutes = (%s::bigint - start_ts) / 60
+             WHERE task_id = %s AND end_time IS NULL
+            RETURNING *
+            """, (now, now_ts, task_id)).fetchall()
+        return moved, sorted(closed, key=lambda entry: entry["id"])
+
+    def move_tasks(self, moves, team_id, now):
+        """One statement: the moves as arrays, a CTE moving the tasks and one closing their open entries."""
+        now, now_ts = stamp(now)
+        moved = {r["id"]: {"user_id": r["user_id"], "closed": r["closed"]} for r in self.conn.execute("""
+        WITH moves AS (
+            SELECT * FROM unnest(%s::bigint[], %s::text[]) AS m(id, status)
+        ), moved AS (
+            UPDATE tasks t SET status = m.status, updated_at = %s
+              FROM moves m
+             WHERE t.id = m.id AND t.team_id = %s
+            RETURNING t.id, t.status, t.user_id
+        ), closed AS (
+            UPDATE time_entries te
+               SET end_time = %s, duration_minutes = (%s::bigint - te.start_ts) / 60
+              FROM moved
+             WHERE te.task_id = moved.id AND moved.status = 'done' AND te.end_time IS NULL
+            RETURNING te.task_id
+        )
+        SELECT moved.id, moved.user_id, (SELECT COUNT(*) FROM closed WHERE closed.task_id = moved.id) AS closed
+          FROM moved
+        """, (list(moves), list(moves.values()), now, team_id, now, now_ts))}
+        return {task_id: moved.get(task_id) for task_id in moves}
+
+    def weekly_report(self, user_id, start, end, build):
+        # no snapshot: the rollup's primary key and idx_tasks_user_created_ts answer it directly
+        totals = self._one("""
+        SELECT COUNT(*) AS tasks_total,
+               COUNT(*) FILTER (WHERE status = 'done') AS tasks_done,
+               (SELECT COALESCE(SUM(minutes), 0) FROM daily_time_rollup
+                 WHERE user_id = %s AND work_date BETWEEN %s AND %s) AS minutes
+          FROM tasks
+         WHERE user_id = %s AND created_ts >= %s AND created_ts < %s
+        """, (user_id, start, end, user_id, epoch_day(start) * 86400, (epoch_day(end) + 1) * 86400))
+        return build(totals)
+
+    # -----------------------
+    # Time entries
+    # -----------------------
+    def start_timer(self, task_id, user_id, now):
+        now_text, now_ts = stamp(now)
+        return self._one("""
+        WITH stopped AS (
+            UPDATE time_entries
+               SET end_time = %s, duration_minutes = (%s::bigint - start_ts) / 60
+             WHERE task_id = %s AND user_id = %s AND end_time IS NULL
+        )
+        INSERT INTO time_entries (task_id, user_id, start_time, work_date)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+        """, (now_text, now_ts, task_id, user_id, task_id, user_id, now_text, now.date()))["id"]
+
+    def stop_timer(self, task_id, user_id, now):
+        now, now_ts = stamp(now)
+        return self._one("""
+        UPDATE time_entries te
+           SET end_time = %s, duration_minutes = (%s::bigint - te.start_ts) / 60
+          FROM tasks t
+         WHERE te.id = (SELECT id FROM time_entries
+                         WHERE task_id = %s AND user_id = %s AND end_time IS NULL
+                         ORDER BY id DESC LIMIT 1)
+           AND t.id = te.task_id
+        RETURNING te.id, t.user_id AS owner_id
+        """, (now, now_ts, task_id, user_id))
+
+    def user_time_entries(self, user_id, start, end):
+        return self.conn.execute("""
+            SELECT te.*, t.title
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            WHERE te.user_id = %s AND te.work_date BETWEEN %s AND %s
+            ORDER BY te.work_date, te.start_time
+        """, (user_id, start, end)).fetchall()
+
+    def iter_time_entries(self, start, end, user_id=None, team_id=None):
+        """Rows come from a server-side cursor, 2000 at a time; nothing else is buffered."""
+        where = "te.work_date BETWEEN %s AND %s"
+        params = [start, end]
+        if user_id is not None:
+            where += " AND te.user_id = %s"
+            params.append(user_id)
+        if team_id is not None:
+            where += " AND u.team_id = %s"
+            params.append(team_id)
+        cur = self.conn.cursor(name="time_entries_export")
+        cur.itersize = 2000
+        cur.execute(f"""
+            SELECT te.id, te.user_id, u.full_name, te.task_id, t.title,
+                   te.work_date, te.start_time, te.end_time, te.duration_minutes
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN users u ON u.id = te.user_id
+            WHERE {where}
+            ORDER BY te.work_date, te.id
+        """, params)
+        return cur
+
+    def minutes_by_day(self, start, end, user_id=None, team_id=None):
+        if user_id is not None:
+            rows = self.conn.execute("""
+            SELECT user_id, work_date, minutes FROM daily_time_rollup
+            WHERE user_id = %s AND work_date BETWEEN %s AND %s
+            """, (user_id, start, end))
+        elif team_id is not None:
+            rows = self.conn.execute("""
+            SELECT r.user_id, r.work_date, r.minutes
+              FROM users u
+              JOIN daily_time_rollup r ON r.user_id = u.id AND r.work_date BETWEEN %s AND %s
+             WHERE u.team_id = %s
+            """, (start, end, team_id))
+        else:
+            rows = self.conn.execute("""
+            SELECT user_id, work_date, minutes FROM daily_time_rollup
+            WHERE work_date BETWEEN %s AND %s
+            """, (start, end))
+        result = {}
+        for r in rows:
+            result.setdefault(r["user_id"], {})[r["work_date"]] = r["minutes"]
+        if user_id is not None:
+            return result.get(user_id, {})
+        return result
+
+    def rebuild_rollup(self):
+        self.conn.execute("DELETE FROM daily_time_rollup")
+        return self.conn.execute("""
+        INSERT INTO daily_time_rollup (user_id, work_date, minutes, entry_count)
+        SELECT user_id, work_date, SUM(duration_minutes), COUNT(*)
+          FROM time_entries
+         WHERE duration_minutes IS NOT NULL
+         GROUP BY user_id, work_date
+        """).rowcount
+
+    # -----------------------
+    # Password resets
+    # -----------------------
+    def create_reset(self, email, otp, minutes=10):
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE email = %s AND used = 0", (email,))
+        self.conn.execute(f"""
+        INSERT INTO password_resets (email, otp, expires_at)
+        VALUES (%s, %s, {UTC_NOW} + make_interval(mins => %s))
+        """, (email, otp, minutes))
+
+    def live_reset(self, email, otp):
+        return self._one(f"""
+            SELECT * FROM password_resets
+            WHERE email = %s AND otp = %s AND used = 0 AND expires_at > {UTC_NOW}
+            ORDER BY created_at DESC LIMIT 1
+        """, (email, otp))
+
+    def use_reset(self, reset_id):
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE id = %s", (reset_id,))
+
+    def otp_locked(self, email):
+        return self._one(f"SELECT 1 FROM otp_attempts WHERE email = %s AND locked_until > {UTC_NOW}",
+                         (email,)) is not None
+
+    def record_otp_failure(self, email, max_attempts=5, lockout_minutes=15):
+        window_start = f"{UTC_NOW} - make_interval(mins => %s)"
+        failures = self._one(f"""
+        INSERT INTO otp_attempts AS a (email, failures, first_failed_at) VALUES (%s, 1, {UTC_NOW})
+        ON CONFLICT (email) DO UPDATE SET
+            failures = CASE WHEN a.first_failed_at <= {window_start} THEN 1 ELSE a.failures + 1 END,
+            first_failed_at = CASE WHEN a.first_failed_at <= {window_start} THEN {UTC_NOW} ELSE a.first_failed_at END
+        RETURNING failures
+        """, (email, lockout_minutes, lockout_minutes))["failures"]
+        if failures < max_attempts:
+            return False
+        self.conn.execute(f"UPDATE otp_attempts SET locked_until = {UTC_NOW} + make_interval(mins => %s) WHERE email = %s",
+                          (lockout_minutes, email))
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE email = %s AND used = 0", (email,))
+        return True
+
+    def clear_otp_failures(self, email):
+        self.conn.execute("DELETE FROM otp_attempts WHERE email = %s", (email,))
+
+    def purge_expired_resets(self, limit):
+        return self.conn.execute(f"""
+        DELETE FROM password_resets WHERE id IN (
+            SELECT id FROM password_resets WHERE expires_at <= {UTC_NOW} LIMIT %s)
+        """, (limit,)).rowcount
+
+    def purge_otp_attempts(self, limit, lockout_minutes=15):
+        return self.conn.execute(f"""
+        DELETE FROM otp_attempts WHERE email IN (
+            SELECT email FROM otp_attempts
+            WHERE COALESCE(locked_until, first_failed_at + make_interval(mins => %s)) <= {UTC_NOW}
+            LIMIT %s)
+        """, (lockout_minutes, limit)).rowcount
+
+    # -----------------------
+    # Email outbox
+    # -----------------------
+    def enqueue_email(self, recipient, subject, body_text, body_html=None):
+        return self._one("""
+        INSERT INTO email_outbox (recipient, subject, body_text, body_html)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+        """, (recipient, subject, body_text, body_html))["id"]
+
+    def claim_emails(self, limit, lease_seconds):
+        """Rows locked by another worker's claim are skipped rather than waited for."""
+        return self.conn.execute(f"""
+        WITH due AS (
+            SELECT * FROM email_outbox
+             WHERE status = 'pending' AND next_attempt_at <= {UTC_NOW}
+             ORDER BY next_attempt_at, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        ), leased AS (
+            UPDATE email_outbox e
+               SET attempts = e.attempts + 1, next_attempt_at = {UTC_NOW} + make_interval(secs => %s)
+              FROM due
+             WHERE e.id = due.id
+        )
+        SELECT * FROM due ORDER BY next_attempt_at, id
+        """, (limit, lease_seconds)).fetchall()
+
+    def finish_emails(self, sent, retry, failed):
+        if sent:
+            self.conn.execute(f"""
+            UPDATE email_outbox SET status = 'sent', sent_at = {UTC_NOW}, last_error = NULL
+            WHERE id = ANY(%s::bigint[])
+            """, (list(sent),))
+        if retry:
+            errors, delays, ids = (list(column) for column in zip(*retry))
+            self.conn.execute(f"""
+            UPDATE email_outbox e
+               SET last_error = r.error, next_attempt_at = {UTC_NOW} + make_interval(secs => r.delay)
+              FROM unnest(%s::text[], %s::integer[], %s::bigint[]) AS r(error, delay, id)
+             WHERE e.id = r.id
+            """, (errors, delays, ids))
+        if failed:
+            errors, ids = (list(column) for column in zip(*failed))
+            self.conn.execute("""
+            UPDATE email_outbox e SET status = 'failed', last_error = r.error
+              FROM unnest(%s::text[], %s::bigint[]) AS r(error, id)
+             WHERE e.id = r.id
+            """, (errors, ids))
+
+    # -----------------------
+    # Board events
+    # -----------------------
+    def publish_event(self, kind, data, owner_id=None):
+        return self._one("INSERT INTO board_events (kind, owner_id, data) VALUES (%s, %s, %s) RETURNING id",
+                         (kind, owner_id, json.dumps(data, separators=(",", ":"))))["id"]
+
+    def publish_events(self, events):
+        self.conn.cursor().executemany("INSERT INTO board_events (kind, owner_id, data) VALUES (%s, %s, %s)",
+                                       [(kind, owner_id, json.dumps(data, separators=(",", ":")))
+                                        for kind, data, owner_id in events])
+
+    def latest_event_id(self):
+        return self._one("SELECT COALESCE(MAX(id), 0) AS id FROM board_events")["id"]
+
+    def events_after(self, after_id, limit=1000):
+        return [(r["id"], r["kind"], r["owner_id"], r["data"]) for r in self.conn.execute("""
+        SELECT id, kind, owner_id, data FROM board_events
+        WHERE id > %s ORDER BY id LIMIT %s
+        """, (after_id, limit))]
+
+    def prune_events(self, up_to_id):
+        self.conn.execute("DELETE FROM board_events WHERE id <= %s", (up_to_id,))
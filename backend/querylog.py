@@ -0,0 +1,100 @@
+import re
+import sqlite3
+
+from flask import g, has_request_context
+
+# -----------------------
+# Slow-query log and query-plan guard
+# -----------------------
+# Opt-in statement tracer attached to every pooled connection (see db.InstrumentedConnection).
+# - Slow-query log: statements slower than QUERY_LOG_SLOW_MS are logged with their
+#   EXPLAIN QUERY PLAN.
+# - Plan guard (QUERY_PLAN_GUARD, on by default when TESTING): a statement run on a
+#   request's connection (get_conn()), or by a writer intent on its behalf (app.write_intent,
+#   g.intent_conn), whose plan contains a full SCAN of a guarded table raises QueryPlanError,
+#   so a test hitting that route fails. Migrations, CLI commands and background workers use
+#   their own connections and are not guarded.
+# Plans are computed once per distinct SQL text.
+
+GUARDED_TABLES = ("tasks", "time_entries", "password_resets")
+PLAN_CACHE_SIZE = 512
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+# table references: FROM/JOIN/UPDATE/INTO <table> [[AS] <alias>]
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+NOT_ALIASES = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "OUTER", "ON", "USING", "SET", "GROUP",
+               "ORDER", "LIMIT", "VALUES", "SELECT", "DEFAULT", "AS", "UNION", "HAVING", "NATURAL"}
+SCAN = re.compile(r"^SCAN (\w+)")
+
+
+class QueryPlanError(AssertionError):
+    pass
+
+
+def table_aliases(sql):
+    """Map every name a table is referred to by in `sql` (alias or table name) to the table."""
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.upper() not in NOT_ALIASES:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+def full_scans(sql, plan, tables=GUARDED_TABLES):
+    """Guarded tables that `plan` (EXPLAIN QUERY PLAN detail lines) reads with a full scan."""
+    aliases = table_aliases(sql)
+    scanned = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if match:
+            table = aliases.get(match.group(1).lower(), match.group(1).lower())
+            if table in tables and table not in scanned:
+                scanned.append(table)
+    return scanned
+
+
+class QueryTracer:
+    def __init__(self, logger, slow_ms=None, guard=False, tables=GUARDED_TABLES):
+        self.logger = logger
+        self.slow_seconds = slow_ms / 1000 if slow_ms is not None else None
+        self.guard = guard
+        self.tables = tables
+        # sql -> (plan lines, guarded tables scanned)
+        self._plans = {}
+
+    def hook(self, conn):
+        conn.add_observer(lambda sql, parameters, seconds, locking:
+                          self._observe(conn, sql, parameters, seconds))
+
+    def plan(self, conn, sql, parameters):
+        cached = self._plans.get(sql)
+        if cached is None:
+            try:
+                # base-class execute: the EXPLAIN itself is not traced
+                rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+                lines = [row[3] for row in rows]
+            except sqlite3.Error as e:
+                lines = [f"(no plan: {e})"]
+            cached = (lines, full_scans(sql, lines, self.tables))
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[sql] = cached
+        return cached
+
+    def _observe(self, conn, sql, parameters, seconds):
+        # executemany() statements and transaction control have no useful plan
+        if parameters is None or not sql.lstrip()[:7].upper().startswith(EXPLAINABLE):
+            return
+        slow = self.slow_seconds is not None and seconds >= self.slow_seconds
+        guarded = self.guard and has_request_context() and (g.get("db_conn") is conn or
+                                                             g.get("intent_conn") is conn)
+        if not (slow or guarded):
+            return
+
+        lines, scanned = self.plan(conn, sql, parameters)
+        if slow:
+            self.logger.warning("[SLOW QUERY] %.1f ms: %s\n  plan: %s",
+                                seconds * 1000, " ".join(sql.split()), "; ".join(lines))
+        if guarded and scanned:
+            raise QueryPlanError(f"full scan of {', '.join(scanned)}: {' '.join(sql.split())}\n"
+                                 f"  plan: {'; '.join(lines)}")
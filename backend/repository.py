@@ -0,0 +1,605 @@
+import json
+import os
+from contextlib import contextmanager
+
+from migrations import migrate
+from rollup import minutes_by_day, rebuild_daily_rollup
+from search import match_query, TITLE_WEIGHT, DESCRIPTION_WEIGHT
+from timestamps import stamp, epoch_day, backfill_epoch_columns, backfill_pending
+
+# -----------------------
+# Storage: repositories and stores
+# -----------------------
+# Route handlers, background workers and CLI commands never run SQL themselves. They ask a
+# store for a repository and call its methods:
+#
+#   store      one database: owns the connection pool and the schema (prepare()).
+#              acquire()/release() lend out a raw connection; session() yields a
+#              repository over a pooled connection for work outside a request.
+#   repository one connection's worth of data access: users and teams, tasks, time entries,
+#              password resets, plus the rows written in the same transaction (board
+#              events, the email outbox, OTP attempt counters).
+#
+# Write methods run in the caller's transaction: wrap them in `with repo.transaction():`
+# (immediate=True takes SQLite's write lock up front, for read-then-write sequences).
+# Rows come back as mappings (row["column"], dict(row)) with the same columns and value
+# formats on every backend.
+#
+# Backends: SQLiteStore/SQLiteRepository (below, the default) and PostgresStore/
+# PostgresRepository (postgres.py, STORAGE_BACKEND = "postgresql").
+
+# Task columns the JSON API exposes, plus the owner's names. team_id, status_rank and the *_ts
+# epochs are bookkeeping and stay server-side.
+TASK_FIELDS = ("id", "title", "description", "priority", "estimated_duration", "day", "status",
+               "user_id", "created_at", "updated_at")
+TASK_COLUMNS = ", ".join(f"tasks.{field}" for field in TASK_FIELDS) + ", users.username, users.full_name"
+
+# Board ordering: status rank, newest first, id as the tie-breaker (matches idx_tasks_user_status_created_ts)
+STATUS_RANKS = {"todo": 1, "inprogress": 2, "done": 3}
+
+
+def task_page(conn, user_id, filters, cursor=None, limit=100, param="?"):
+    """
+    Yield up to `limit` of a user's tasks in board order, starting after `cursor`
+    ((status_rank, created_ts, id) of the last row sent). Each status rank is read as its
+    own index range so the cursor is a seek, not an offset. Shared by both backends;
+    `param` is the driver's placeholder. Rows carry TASK_COLUMNS plus the cursor columns.
+    filters: optional status, day, priority, created_from/created_to, updated_from/updated_to
+    (dates, both ends inclusive).
+    """
+    where = [f"tasks.user_id = {param}"]
+    params = [user_id]
+    for column in ("day", "priority"):
+        if filters.get(column):
+            where.append(f"tasks.{column} = {param}")
+            params.append(filters[column])
+    for column in ("created", "updated"):
+        if filters.get(f"{column}_from"):
+            where.append(f"tasks.{column}_ts >= {param}")
+            params.append(epoch_day(filters[f"{column}_from"]) * 86400)
+        if filters.get(f"{column}_to"):
+            where.append(f"tasks.{column}_ts < {param}")
+            params.append((epoch_day(filters[f"{column}_to"]) + 1) * 86400)
+
+    if filters.get("status"):
+        ranks = [STATUS_RANKS[filters["status"]]]
+    else:
+        ranks = sorted(STATUS_RANKS.values())
+    if cursor:
+        ranks = [r for r in ranks if r >= cursor[0]]
+
+    remaining = limit
+    for rank in ranks:
+        rank_where = where + [f"tasks.status_rank = {param}"]
+        rank_params = params + [rank]
+        if cursor and rank == cursor[0]:
+            # seek to the cursor, then skip rows sharing its created_ts that were already sent
+            rank_where.append(f"tasks.created_ts <= {param} AND NOT (tasks.created_ts = {param} AND tasks.id <= {param})")
+            rank_params += [cursor[1], cursor[1], cursor[2]]
+        rows = conn.execute(f"""
+        SELECT {TASK_COLUMNS}, tasks.status_rank, tasks.created_ts
+        FROM tasks
+        JOIN users ON users.id = tasks.user_id
+        WHERE {" AND ".join(rank_where)}
+        ORDER BY tasks.created_ts DESC, tasks.id
+        LIMIT {param}
+        """, rank_params + [remaining])
+        for row in rows:
+            yield row
+            remaining -= 1
+        if remaining <= 0:
+            return
+
+
+class SQLiteStore:
+    """A SQLite database file behind a db.ConnectionPool."""
+
+    backend = "sqlite"
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    def connect(self):
+        """A connection outside the pool, for a thread that keeps its own (the caller closes it)."""
+        return self.pool.connect()
+
+    def repository(self, conn):
+        return SQLiteRepository(conn)
+
+    @contextmanager
+    def session(self):
+        with self.pool.connection() as conn:
+            yield SQLiteRepository(conn)
+
+    def prepare(self):
+        """Create the file's folder, then create or upgrade its schema."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.pool.path)), exist_ok=True)
+        with self.pool.connection() as conn:
+            migrate(conn)
+
+    def stats(self):
+        return self.pool.stats()
+
+
+class SQLiteRepository:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        if immediate:
+            self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    @contextmanager
+    def savepoint(self):
+        """Nested scope inside transaction(): an exception undoes only the writes made within it."""
+        self.conn.execute("SAVEPOINT nested")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK TO SAVEPOINT nested")
+            raise
+        finally:
+            self.conn.execute("RELEASE SAVEPOINT nested")
+
+    # -----------------------
+    # Users and teams
+    # -----------------------
+    def user_by_username(self, username):
+        return self.conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+
+    def user_by_email(self, email):
+        return self.conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+
+    def user_team_id(self, user_id):
+        row = self.conn.execute("SELECT team_id FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row["team_id"] if row else None
+
+    def user_exists(self, username, email):
+        return self.conn.execute("SELECT id FROM users WHERE username = ? OR email = ?",
+                                 (username, email)).fetchone() is not None
+
+    def create_user(self, username, full_name, email, password_hash, team_id):
+        return self.conn.execute("""
+        INSERT INTO users (username, full_name, email, password_hash, team_id) VALUES (?, ?, ?, ?, ?)
+        RETURNING id, username, full_name, team_id
+        """, (username, full_name, email, password_hash, team_id)).fetchone()
+
+    def set_password(self, email, password_hash):
+        self.conn.execute("UPDATE users SET password_hash = ? WHERE email = ?", (password_hash, email))
+
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        """Compare-and-set: False if the hash changed since old_hash was read."""
+        cur = self.conn.execute("UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                                (new_hash, user_id, old_hash))
+        return cur.rowcount > 0
+
+    def team_members(self, team_id):
+        return self.conn.execute("SELECT id, username, full_name FROM users WHERE team_id = ? ORDER BY id",
+                                 (team_id,)).fetchall()
+
+    def set_user_team(self, user_id, team_id):
+        self.conn.execute("UPDATE users SET team_id = ? WHERE id = ?", (team_id, user_id))
+
+    def team_by_slug(self, slug):
+        return self.conn.execute("SELECT * FROM teams WHERE slug = ?", (slug,)).fetchone()
+
+    def team_shard(self, team_id):
+        """The team's teams.shard (None: the main database, or no such team)."""
+        row = self.conn.execute("SELECT shard FROM teams WHERE id = ?", (team_id,)).fetchone()
+        return row["shard"] if row else None
+
+    def create_team(self, slug, name, shard=None):
+        return self.conn.execute("INSERT INTO teams (slug, name, shard) VALUES (?, ?, ?)",
+                                 (slug, name, shard)).lastrowid
+
+    def mirror_user(self, user):
+        """Copy a user's directory row into a shard (no email or password)."""
+        self.conn.execute("""
+        INSERT INTO users (id, username, full_name, password_hash, team_id) VALUES (?, ?, ?, '!', ?)
+        ON CONFLICT(id) DO UPDATE SET
+            username = excluded.username, full_name = excluded.full_name, team_id = excluded.team_id
+        """, (user["id"], user["username"], user["full_name"], user["team_id"]))
+
+    def delete_user(self, user_id):
+        self.conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+
+    def has_board_data(self, user_id):
+        """True if the user owns tasks or logged time in this database."""
+        row = self.conn.execute("""
+        SELECT EXISTS(SELECT 1 FROM tasks WHERE user_id = ?)
+            OR EXISTS(SELECT 1 FROM time_entries WHERE user_id = ?)
+        """, (user_id, user_id)).fetchone()
+        return bool(row[0])
+
+    def move_user_tasks(self, user_id, team_id):
+        self.conn.execute("UPDATE tasks SET team_id = ? WHERE user_id = ?", (team_id, user_id))
+
+    def change_version(self, scope):
+        """(version, changed_at) of a change_versions scope, or None if it never changed."""
+        return self.conn.execute("SELECT version, changed_at FROM change_versions WHERE scope = ?",
+                                 (scope,)).fetchone()
+
+    # -----------------------
+    # Tasks
+    # -----------------------
+    def add_task(self, title, description, priority, estimated_duration, day, user_id, team_id):
+        return self.conn.execute("""
+        INSERT INTO tasks (title, description, priority, estimated_duration, day, user_id, team_id, created_ts, updated_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+        RETURNING id, user_id
+        """, (title, description, priority, estimated_duration, day, user_id, team_id)).fetchone()
+
+    def add_tasks(self, rows):
+        """
+        Insert many tasks. rows: (title, description, priority, estimated_duration, day, user_id, team_id).
+        Returns the new ids in input order. Run it in transaction(immediate=True).
+        """
+        self.conn.executemany("""
+        INSERT INTO tasks (title, description, priority, estimated_duration, day, user_id, team_id, created_ts, updated_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+        """, rows)
+        # AUTOINCREMENT under the write lock hands out consecutive ids
+        last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    def board(self, user_id):
+        """A user's tasks in board order, as dicts."""
+        return [dict(row) for row in self.conn.execute("""
+        SELECT tasks.*, users.username, users.full_name
+        FROM tasks
+        JOIN users ON users.id = tasks.user_id
+        WHERE tasks.user_id = ?
+        ORDER BY tasks.status_rank, tasks.created_ts DESC
+        """, (user_id,))]
+
+    def task_page(self, user_id, filters, cursor=None, limit=100):
+        return task_page(self.conn, user_id, filters, cursor, limit)
+
+    def search_tasks(self, user_id, terms, limit, offset=0):
+        """A user's tasks containing every term as a word prefix (see search.py), best match first."""
+        return self.conn.execute(f"""
+        SELECT {TASK_COLUMNS}
+        FROM tasks_fts
+        JOIN tasks ON tasks.id = tasks_fts.rowid
+        JOIN users ON users.id = tasks.user_id
+        WHERE tasks_fts MATCH ? AND tasks.user_id = ?
+        ORDER BY bm25(tasks_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}), tasks.id DESC
+        LIMIT ? OFFSET ?
+        """, (match_query(terms), user_id, limit, offset)).fetchall()
+
+    def team_task(self, task_id, team_id):
+        return self.conn.execute("SELECT id, user_id FROM tasks WHERE id = ? AND team_id = ?",
+                                 (task_id, team_id)).fetchone()
+
+    def rename_task(self, task_id, team_id, title, now):
+        return self.conn.execute("UPDATE tasks SET title=?, updated_at=?, updated_ts=? WHERE id=? AND team_id=? RETURNING *",
+                                 (title, *stamp(now), task_id, team_id)).fetchone()
+
+    def delete_task(self, task_id, team_id):
+        return self.conn.execute("DELETE FROM tasks WHERE id = ? AND team_id = ? RETURNING *",
+                                 (task_id, team_id)).fetchone()
+
+    def move_task(self, task_id, new_status, team_id, now):
+        """
+        Move one of a team's tasks; moving to done closes every open time entry of the task,
+        whoever started it (as move_tasks does). Returns (task row or None, closed entry rows
+        ordered by id).
+        """
+        c = self.conn.cursor()
+        closed = []
+        now, now_ts = stamp(now)
+        moved = c.execute("""
+        UPDATE tasks SET status = ?, updated_at = ?, updated_ts = ?
+        WHERE id = ? AND team_id = ?
+        RETURNING *
+        """, (new_status, now, now_ts, task_id, team_id)).fetchone()
+        if moved and new_status == "done":
+            closed = c.execute("""
+            UPDATE time_entries
+               SET end_time = ?, end_ts = ?, duration_minutes = (? - start_ts) / 60
+             WHERE task_id = ? AND end_time IS NULL
+            RETURNING *
+            """, (now, now_ts, now_ts, task_id)).fetchall()
+        return moved, sorted(closed, key=lambda entry: entry["id"])
+
+    def move_tasks(self, moves, team_id, now):
+        """
+        Move many of a team's tasks. moves: {task_id: new_status}. Every open time entry of a
+        task moved to done is closed, as in move_task. Returns {task_id: {"user_id": owner,
+        "closed": time entries closed}, or None if the team has no such task}.
+        Run it in transaction(immediate=True).
+        """
+        conn = self.conn
+        now, now_ts = stamp(now)
+        existing = {r["id"]: r["user_id"] for r in conn.execute(
+            "SELECT id, user_id FROM tasks WHERE id IN (SELECT value FROM json_each(?)) AND team_id = ?",
+            (json.dumps(list(moves)), team_id))}
+        by_status = {}
+        for task_id, status in moves.items():
+            if task_id in existing:
+                by_status.setdefault(status, []).append(task_id)
+        closed = {}
+        done_ids = json.dumps(by_status.get("done", []))
+        if by_status.get("done"):
+            closed = {r["task_id"]: r["n"] for r in conn.execute("""
+            SELECT task_id, COUNT(*) AS n FROM time_entries
+            WHERE task_id IN (SELECT value FROM json_each(?)) AND end_time IS NULL
+            GROUP BY task_id
+            """, (done_ids,))}
+            conn.execute("""
+            UPDATE time_entries
+               SET end_time = ?, end_ts = ?, duration_minutes = (? - start_ts) / 60
+             WHERE task_id IN (SELECT value FROM json_each(?)) AND end_time IS NULL
+            """, (now, now_ts, now_ts, done_ids))
+        for status, task_ids in by_status.items():
+            conn.execute("""
+            UPDATE tasks SET status = ?, updated_at = ?, updated_ts = ?
+            WHERE id IN (SELECT value FROM json_each(?))
+            """, (status, now, now_ts, json.dumps(task_ids)))
+        return {task_id: ({"user_id": existing[task_id], "closed": closed.get(task_id, 0)}
+                          if task_id in existing else None) for task_id in moves}
+
+    def weekly_report(self, user_id, start, end, build):
+        """
+        A user's week as build(totals) (totals: tasks_total, tasks_done, minutes).
+        Served from weekly_report_snapshot; triggers drop the snapshot whenever the user's
+        tasks or logged time for that week change, so a miss recomputes it.
+        """
+        week_start = start.strftime("%Y-%m-%d")
+        snapshot = self.conn.execute("""
+        SELECT hours_worked, tasks_total, tasks_done, completion_rate, rating
+          FROM weekly_report_snapshot
+         WHERE user_id = ? AND week_start = ?
+        """, (user_id, week_start)).fetchone()
+        if snapshot:
+            return dict(snapshot)
+
+        # Compute and store under the write lock so a concurrent write can't be missed
+        with self.transaction(immediate=True):
+            totals = self.conn.execute("""
+            SELECT COUNT(*) AS tasks_total,
+                   COALESCE(SUM(status = 'done'), 0) AS tasks_done,
+                   (SELECT COALESCE(SUM(minutes), 0) FROM daily_time_rollup
+                     WHERE user_id = ? AND work_date BETWEEN ? AND ?) AS minutes
+              FROM tasks
+             WHERE user_id = ? AND created_ts >= ? AND created_ts < ?
+            """, (user_id, week_start, end.strftime("%Y-%m-%d"),
+                  user_id, epoch_day(start) * 86400, (epoch_day(end) + 1) * 86400)).fetchone()
+            report = build(totals)
+            self.conn.execute("""
+            INSERT OR REPLACE INTO weekly_report_snapshot
+                (user_id, week_start, hours_worked, tasks_total, tasks_done, completion_rate, rating)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, week_start, report["hours_worked"], report["tasks_total"], report["tasks_done"],
+                  report["completion_rate"], report["rating"]))
+        return report
+
+    # -----------------------
+    # Time entries
+    # -----------------------
+    def start_timer(self, task_id, user_id, now):
+        """Stop the user's running timer on the task, if any, and start a new one. Returns its id."""
+        now_text, now_ts = stamp(now)
+        self.conn.execute("""
+        UPDATE time_entries
+           SET end_time = ?, end_ts = ?, duration_minutes = (? - start_ts) / 60
+         WHERE task_id = ? AND user_id = ? AND end_time IS NULL
+        """, (now_text, now_ts, now_ts, task_id, user_id))
+        return self.conn.execute("""
+        INSERT INTO time_entries (task_id, user_id, start_time, start_ts, work_date, work_day)
+        VALUES (?,?,?,?,?,?)
+        """, (task_id, user_id, now_text, now_ts, now.strftime("%Y-%m-%d"), epoch_day(now))).lastrowid
+
+    def stop_timer(self, task_id, user_id, now):
+        """Close the user's running timer on the task. Returns (id, owner_id) or None."""
+        now, now_ts = stamp(now)
+        open_entry = self.conn.execute("""
+        SELECT te.id, t.user_id AS owner_id FROM time_entries te
+        JOIN tasks t ON t.id = te.task_id
+        WHERE te.task_id = ? AND te.user_id = ? AND te.end_time IS NULL
+        ORDER BY te.id DESC LIMIT 1
+        """, (task_id, user_id)).fetchone()
+        if open_entry:
+            self.conn.execute("""
+            UPDATE time_entries
+               SET end_time = ?, end_ts = ?, duration_minutes = (? - start_ts) / 60
+             WHERE id = ?
+            """, (now, now_ts, now_ts, open_entry["id"]))
+        return open_entry
+
+    def user_time_entries(self, user_id, start, end):
+        """A user's entries (with task title) for work dates start..end, in order."""
+        return self.conn.execute("""
+            SELECT te.*, t.title
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            WHERE te.user_id=? AND te.work_day BETWEEN ? AND ?
+            ORDER by te.work_day, te.start_ts
+        """, (user_id, epoch_day(start), epoch_day(end))).fetchall()
+
+    def iter_time_entries(self, start, end, user_id=None, team_id=None):
+        """
+        Time entries with task title and user name for work dates start..end (inclusive),
+        optionally only one user's and/or one team's.
+        Rows come straight off the SQLite cursor; nothing is buffered.
+        """
+        where = "te.work_day BETWEEN ? AND ?"
+        params = [epoch_day(start), epoch_day(end)]
+        if user_id is not None:
+            where += " AND te.user_id = ?"
+            params.append(user_id)
+        if team_id is not None:
+            where += " AND u.team_id = ?"
+            params.append(team_id)
+        # ordered by id within a day so the work_day index supplies the order (no sort pass)
+        return self.conn.execute(f"""
+            SELECT te.id, te.user_id, u.full_name, te.task_id, t.title,
+                   te.work_date, te.start_time, te.end_time, te.duration_minutes
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN users u ON u.id = te.user_id
+            WHERE {where}
+            ORDER BY te.work_day, te.id
+        """, params)
+
+    def minutes_by_day(self, start, end, user_id=None, team_id=None):
+        return minutes_by_day(self.conn, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"),
+                              user_id=user_id, team_id=team_id)
+
+    def rebuild_rollup(self):
+        """Recompute daily_time_rollup. Run it in transaction(immediate=True)."""
+        return rebuild_daily_rollup(self.conn)
+
+    def backfill_pending(self):
+        return backfill_pending(self.conn)
+
+    def backfill_epoch_columns(self, **options):
+        """See timestamps.backfill_epoch_columns. Commits its own batches: not in transaction()."""
+        return backfill_epoch_columns(self.conn, **options)
+
+    # -----------------------
+    # Password resets
+    # -----------------------
+    def create_reset(self, email, otp, minutes=10):
+        """Burn the email's live OTPs and store a new one expiring in `minutes` (UTC, like DATETIME('now'))."""
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE email = ? AND used = 0", (email,))
+        self.conn.execute("INSERT INTO password_resets (email, otp, expires_at) VALUES (?, ?, DATETIME('now', ?))",
+                          (email, otp, f"+{minutes} minutes"))
+
+    def live_reset(self, email, otp):
+        return self.conn.execute("""
+            SELECT * FROM password_resets
+            WHERE email = ? AND otp = ? AND used = 0 AND expires_at > DATETIME('now')
+            ORDER BY created_at DESC LIMIT 1
+        """, (email, otp)).fetchone()
+
+    def use_reset(self, reset_id):
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE id = ?", (reset_id,))
+
+    def otp_locked(self, email):
+        row = self.conn.execute("SELECT 1 FROM otp_attempts WHERE email = ? AND locked_until > DATETIME('now')",
+                                (email,)).fetchone()
+        return row is not None
+
+    def record_otp_failure(self, email, max_attempts=5, lockout_minutes=15):
+        """
+        Count a wrong guess (the window restarts once it is lockout_minutes old).
+        Returns True if this guess locked the email out: its live OTPs are burned too.
+        """
+        window = f"-{lockout_minutes} minutes"
+        failures = self.conn.execute("""
+        INSERT INTO otp_attempts (email, failures, first_failed_at) VALUES (?, 1, DATETIME('now'))
+        ON CONFLICT(email) DO UPDATE SET
+            failures = CASE WHEN first_failed_at <= DATETIME('now', ?) THEN 1 ELSE failures + 1 END,
+            first_failed_at = CASE WHEN first_failed_at <= DATETIME('now', ?) THEN DATETIME('now') ELSE first_failed_at END
+        RETURNING failures
+        """, (email, window, window)).fetchone()[0]
+        if failures < max_attempts:
+            return False
+        self.conn.execute("UPDATE otp_attempts SET locked_until = DATETIME('now', ?) WHERE email = ?",
+                          (f"+{lockout_minutes} minutes", email))
+        self.conn.execute("UPDATE password_resets SET used = 1 WHERE email = ? AND used = 0", (email,))
+        return True
+
+    def clear_otp_failures(self, email):
+        self.conn.execute("DELETE FROM otp_attempts WHERE email = ?", (email,))
+
+    def purge_expired_resets(self, limit):
+        # used rows are skipped by lookups (the OTP index only covers used = 0) and expire
+        # within minutes, so expiry alone keeps the table bounded
+        return self.conn.execute("""
+        DELETE FROM password_resets WHERE id IN (
+            SELECT id FROM password_resets WHERE expires_at <= DATETIME('now') LIMIT ?)
+        """, (limit,)).rowcount
+
+    def purge_otp_attempts(self, limit, lockout_minutes=15):
+        return self.conn.execute("""
+        DELETE FROM otp_attempts WHERE email IN (
+            SELECT email FROM otp_attempts
+            WHERE COALESCE(locked_until, DATETIME(first_failed_at, ?)) <= DATETIME('now')
+            LIMIT ?)
+        """, (f"+{lockout_minutes} minutes", limit)).rowcount
+
+    # -----------------------
+    # Email outbox
+    # -----------------------
+    def enqueue_email(self, recipient, subject, body_text, body_html=None):
+        return self.conn.execute("""
+        INSERT INTO email_outbox (recipient, subject, body_text, body_html)
+        VALUES (?, ?, ?, ?)
+        """, (recipient, subject, body_text, body_html)).lastrowid
+
+    def claim_emails(self, limit, lease_seconds):
+        """
+        Due messages, leased for lease_seconds (next_attempt_at pushed forward, attempts
+        counted). Rows are returned as they were before the claim.
+        Run it in transaction(immediate=True).
+        """
+        rows = self.conn.execute("""
+        SELECT * FROM email_outbox
+        WHERE status = 'pending' AND next_attempt_at <= DATETIME('now')
+        ORDER BY next_attempt_at, id
+        LIMIT ?
+        """, (limit,)).fetchall()
+        if rows:
+            self.conn.executemany("""
+            UPDATE email_outbox
+               SET attempts = attempts + 1, next_attempt_at = DATETIME('now', ?)
+             WHERE id = ?
+            """, [(f"+{lease_seconds} seconds", r["id"]) for r in rows])
+        return rows
+
+    def finish_emails(self, sent, retry, failed):
+        """sent: ids; retry: (error, delay seconds, id); failed: (error, id)."""
+        self.conn.executemany("""
+        UPDATE email_outbox SET status = 'sent', sent_at = DATETIME('now'), last_error = NULL
+        WHERE id = ?
+        """, [(email_id,) for email_id in sent])
+        self.conn.executemany("""
+        UPDATE email_outbox SET last_error = ?, next_attempt_at = DATETIME('now', ?)
+        WHERE id = ?
+        """, [(error, f"+{delay} seconds", email_id) for error, delay, email_id in retry])
+        self.conn.executemany("UPDATE email_outbox SET status = 'failed', last_error = ? WHERE id = ?", failed)
+
+    # -----------------------
+    # Board events
+    # -----------------------
+    def publish_event(self, kind, data, owner_id=None):
+        """
+        Record an event for /events subscribers.
+        owner_id: the user whose board shows the task; None sends it to every subscriber.
+        """
+        return self.conn.execute("INSERT INTO board_events (kind, owner_id, data) VALUES (?, ?, ?)",
+                                 (kind, owner_id, json.dumps(data, separators=(",", ":")))).lastrowid
+
+    def publish_events(self, events):
+        """publish_event for many events at once. events: (kind, data, owner_id)."""
+        self.conn.executemany("INSERT INTO board_events (kind, owner_id, data) VALUES (?, ?, ?)",
+                              [(kind, owner_id, json.dumps(data, separators=(",", ":")))
+                               for kind, data, owner_id in events])
+
+    def latest_event_id(self):
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM board_events").fetchone()[0]
+
+    def events_after(self, after_id, limit=1000):
+        """(id, kind, owner_id, data) tuples, oldest first."""
+        return [(r["id"], r["kind"], r["owner_id"], r["data"]) for r in self.conn.execute("""
+        SELECT id, kind, owner_id, data FROM board_events
+        WHERE id > ? ORDER BY id LIMIT ?
+        """, (after_id, limit))]
+
+    def prune_events(self, up_to_id):
+        self.conn.execute("DELETE FROM board_events WHERE id <= ?", (up_to_id,))
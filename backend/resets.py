@@ -0,0 +1,77 @@
+import threading
+import time
+
+# -----------------------
+# Password reset hygiene
+# -----------------------
+# - OTP guesses are counted per email in otp_attempts (repository.record_otp_failure). After
+#   OTP_MAX_ATTEMPTS failures within the window the email is locked out: its active OTPs are
+#   burned and further guesses are rejected from one primary-key lookup (otp_locked), before
+#   password_resets is touched.
+# - ResetJanitor deletes expired password_resets rows and stale attempt counters in small
+#   batches, each in its own short transaction, so it never holds the write lock for long.
+
+ATTEMPTS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS otp_attempts(
+        email TEXT PRIMARY KEY,
+        failures INTEGER NOT NULL,
+        first_failed_at TEXT NOT NULL,
+        locked_until TEXT
+    ) WITHOUT ROWID
+    """,
+]
+
+
+class ResetJanitor:
+    """Background purge of password_resets and otp_attempts. Started by the first reset request."""
+
+    def __init__(self, store, interval=60.0, batch_size=500, lockout_minutes=15, pause=0.05):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lockout_minutes = lockout_minutes
+        self.pause = pause
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="reset-janitor", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.purge()
+            except Exception as e:
+                print(f"[JANITOR ERROR] {e}")
+            self._stop.wait(self.interval)
+
+    def _delete_batches(self, repo, delete):
+        deleted = 0
+        while not self._stop.is_set():
+            with repo.transaction():
+                rowcount = delete(self.batch_size)
+            deleted += rowcount
+            if rowcount < self.batch_size:
+                break
+            time.sleep(self.pause)  # let request writers in between batches
+        return deleted
+
+    def purge(self):
+        """Delete expired resets and stale attempt counters. Returns (resets, counters) deleted."""
+        with self.store.session() as repo:
+            resets = self._delete_batches(repo, repo.purge_expired_resets)
+            counters = self._delete_batches(
+                repo, lambda limit: repo.purge_otp_attempts(limit, self.lockout_minutes))
+        return resets, counters
@@ -0,0 +1,107 @@
+# -----------------------
+# Daily time rollup
+# -----------------------
+# daily_time_rollup keeps one row per (user, work_date) with the minutes and number of
+# finished time entries for that day. Triggers on time_entries keep it current, so any
+# statement that writes duration_minutes (timer_stop, timer_start auto-close,
+# move_task on done) updates the rollup in the same transaction.
+
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_time_rollup(
+        user_id INTEGER NOT NULL,
+        work_date TEXT NOT NULL,
+        minutes INTEGER NOT NULL DEFAULT 0,
+        entry_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, work_date)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_daily_time_rollup_date ON daily_time_rollup(work_date)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_time_entries_rollup_insert
+    AFTER INSERT ON time_entries
+    WHEN NEW.duration_minutes IS NOT NULL
+    BEGIN
+        INSERT INTO daily_time_rollup (user_id, work_date, minutes, entry_count)
+        VALUES (NEW.user_id, NEW.work_date, NEW.duration_minutes, 1)
+        ON CONFLICT(user_id, work_date) DO UPDATE
+           SET minutes = minutes + excluded.minutes,
+               entry_count = entry_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_time_entries_rollup_update
+    AFTER UPDATE OF duration_minutes, user_id, work_date ON time_entries
+    BEGIN
+        UPDATE daily_time_rollup
+           SET minutes = minutes - OLD.duration_minutes,
+               entry_count = entry_count - 1
+         WHERE OLD.duration_minutes IS NOT NULL
+           AND user_id = OLD.user_id AND work_date = OLD.work_date;
+        INSERT INTO daily_time_rollup (user_id, work_date, minutes, entry_count)
+        SELECT NEW.user_id, NEW.work_date, NEW.duration_minutes, 1
+         WHERE NEW.duration_minutes IS NOT NULL
+        ON CONFLICT(user_id, work_date) DO UPDATE
+           SET minutes = minutes + excluded.minutes,
+               entry_count = entry_count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_time_entries_rollup_delete
+    AFTER DELETE ON time_entries
+    WHEN OLD.duration_minutes IS NOT NULL
+    BEGIN
+        UPDATE daily_time_rollup
+           SET minutes = minutes - OLD.duration_minutes,
+               entry_count = entry_count - 1
+         WHERE user_id = OLD.user_id AND work_date = OLD.work_date;
+    END
+    """,
+]
+
+def rebuild_daily_rollup(conn):
+    """
+    Recompute daily_time_rollup from time_entries.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    conn.execute("DELETE FROM daily_time_rollup")
+    cur = conn.execute("""
+    INSERT INTO daily_time_rollup (user_id, work_date, minutes, entry_count)
+    SELECT user_id, work_date, SUM(duration_minutes), COUNT(*)
+      FROM time_entries
+     WHERE duration_minutes IS NOT NULL
+     GROUP BY user_id, work_date
+    """)
+    return cur.rowcount
+
+def minutes_by_day(conn, start, end, user_id=None, team_id=None):
+    """
+    Logged minutes per day between start and end (inclusive, YYYY-MM-DD strings).
+    Returns {user_id: {work_date: minutes}} for everyone, or only the members of team_id;
+    a single user's dict if user_id is given.
+    """
+    if user_id is not None:
+        rows = conn.execute("""
+        SELECT user_id, work_date, minutes FROM daily_time_rollup
+        WHERE user_id = ? AND work_date BETWEEN ? AND ?
+        """, (user_id, start, end)).fetchall()
+    elif team_id is not None:
+        # members first (idx_users_team), then one primary-key range per member
+        rows = conn.execute("""
+        SELECT r.user_id, r.work_date, r.minutes
+          FROM users u
+          JOIN daily_time_rollup r ON r.user_id = u.id AND r.work_date BETWEEN ? AND ?
+         WHERE u.team_id = ?
+        """, (start, end, team_id)).fetchall()
+    else:
+        rows = conn.execute("""
+        SELECT user_id, work_date, minutes FROM daily_time_rollup
+        WHERE work_date BETWEEN ? AND ?
+        """, (start, end)).fetchall()
+
+    result = {}
+    for r in rows:
+        result.setdefault(r["user_id"], {})[r["work_date"]] = r["minutes"]
+    if user_id is not None:
+        return result.get(user_id, {})
+    return result
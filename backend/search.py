@@ -0,0 +1,58 @@
+import re
+
+# -----------------------
+# Task search
+# -----------------------
+# tasks_fts is an FTS5 index over tasks.title and tasks.description. It is an external
+# content table (it keeps only the index and reads the text back from tasks), kept in step
+# by triggers on tasks, so every writer (add_task, /task/add, the bulk add, /update, the
+# deletes) updates it in its own transaction. Moving a task doesn't touch it.
+# /api/tasks/search turns the user's words into a prefix query (match_query) and ranks
+# the matches with bm25, a hit in the title counting for more than one in the description.
+
+SEARCH_MAX_TERMS = 8
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+SEARCH_SCHEMA = [
+    # prefix indexes make 2- and 3-letter prefixes (a search box being typed into) cheap
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description,
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_insert
+    AFTER INSERT ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_update
+    AFTER UPDATE OF title, description ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_delete
+    AFTER DELETE ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END
+    """,
+    # index the existing tasks (one pass over the table)
+    "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+]
+
+def search_terms(text):
+    """The words of a search box entry (runs of letters and digits), at most SEARCH_MAX_TERMS."""
+    return re.findall(r"[^\W_]+", text or "")[:SEARCH_MAX_TERMS]
+
+def match_query(terms):
+    """FTS5 query for tasks containing every term as the start of a word (quoted: no operators)."""
+    return " ".join(f'"{term}"*' for term in terms)
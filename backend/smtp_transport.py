@@ -0,0 +1,92 @@
+import smtplib
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# -----------------------
+# SMTP transport for the email outbox
+# -----------------------
+class SMTPSession:
+    """
+    One SMTP connection reused across messages and batches.
+    Reconnects when the server has dropped it and closes it after `idle_timeout` seconds unused.
+    """
+
+    def __init__(self, server, port, username, password, timeout=10, idle_timeout=60):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if smtp.has_extn("starttls"):
+            smtp.starttls()
+            smtp.ehlo()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _ensure(self):
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self.close()
+        self._smtp = self._connect()
+        return self._smtp
+
+    def send(self, sender, recipient, message):
+        try:
+            self._ensure().sendmail(sender, [recipient], message)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped us between NOOP and send; one fresh attempt
+            self.close()
+            self._ensure().sendmail(sender, [recipient], message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+def build_message(sender, row):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = row["subject"]
+    msg["From"] = sender
+    msg["To"] = row["recipient"]
+    msg.attach(MIMEText(row["body_text"], "plain"))
+    if row["body_html"]:
+        msg.attach(MIMEText(row["body_html"], "html"))
+    return msg.as_string()
+
+
+class SMTPTransport:
+    """Outbox transport over a persistent SMTPSession."""
+
+    def __init__(self, session, sender):
+        self.session = session
+        self.sender = sender
+
+    def __call__(self, row):
+        self.session.send(self.sender, row["recipient"], build_message(self.sender, row))
+
+    def close_if_idle(self):
+        self.session.close_if_idle()
+
+    def close(self):
+        self.session.close()
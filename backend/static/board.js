@@ -0,0 +1,73 @@
+// Kanban board: in-place updates instead of full dashboard reloads.
+(() => {
+  const card = id => document.querySelector(`.task[data-task-id="${id}"]`);
+
+  function moveCard(id, status) {
+    const el = card(id);
+    const column = document.querySelector(`.col[data-status="${status}"] .col-body`);
+    if (el && column && el.parentElement !== column) {
+      column.querySelector(":scope > .muted")?.remove();
+      column.prepend(el);
+    }
+  }
+
+  // Move/delete/timer buttons post as JSON and update the card; without JS they stay plain forms.
+  document.querySelectorAll(".task form").forEach(form => {
+    form.addEventListener("submit", async e => {
+      if (e.defaultPrevented) return;  // e.g. the delete confirm() was cancelled
+      e.preventDefault();
+      const response = await fetch(form.action, {
+        method: "POST",
+        headers: { "Accept": "application/json" },
+        credentials: "same-origin",
+      });
+      const data = await response.json().catch(() => null);
+      if (!response.ok || !data || !data.success) {
+        alert((data && data.message) || "Something went wrong.");
+        return;
+      }
+      const article = form.closest(".task");
+      if (form.action.includes("/task/delete/")) article.remove();
+      else if (data.task) moveCard(data.task.id, data.task.status);
+      if (data.closed_time_entry) article.classList.remove("timer-running");
+      if (form.action.includes("/timer/start/")) article.classList.add("timer-running");
+      if (form.action.includes("/timer/stop/")) article.classList.remove("timer-running");
+    });
+  });
+
+  // Live updates from /events (Server-Sent Events).
+  // EventSource reconnects on its own and resumes from the last event id it saw.
+  if (!window.EventSource) return;
+  const source = new EventSource("/events");
+  let reloadTimer = null;
+
+  source.addEventListener("task.moved", e => {
+    const data = JSON.parse(e.data);
+    moveCard(data.task_id, data.status);
+  });
+
+  source.addEventListener("task.updated", e => {
+    const data = JSON.parse(e.data);
+    const title = card(data.task_id)?.querySelector(".task-title");
+    if (title) title.textContent = `#${data.task_id} — ${data.title}`;
+  });
+
+  source.addEventListener("task.deleted", e => {
+    card(JSON.parse(e.data).task_id)?.remove();
+  });
+
+  // new cards need server-rendered forms: refresh once things settle
+  source.addEventListener("task.added", e => {
+    if (card(JSON.parse(e.data).task_id)) return;
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => window.location.reload(), 1500);
+  });
+
+  source.addEventListener("timer.started", e => {
+    card(JSON.parse(e.data).task_id)?.classList.add("timer-running");
+  });
+
+  source.addEventListener("timer.stopped", e => {
+    card(JSON.parse(e.data).task_id)?.classList.remove("timer-running");
+  });
+})();
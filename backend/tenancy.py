@@ -0,0 +1,70 @@
+import threading
+
+# -----------------------
+# Teams and shards
+# -----------------------
+# Every user belongs to one team (users.team_id) and every task to its owner's team
+# (tasks.team_id). Request code only reads and writes its own team's rows.
+#
+# The shard map says where a team's data lives: teams.shard names an entry of the SHARDS
+# config ({name: database path}); NULL means the main database. The main database always
+# holds the directory (teams, accounts, password resets). A sharded team's tasks, time
+# entries, rollups and events live in its own file, which also keeps a copy of the team's
+# user rows (no email, no password) so board queries join locally. Each file has its
+# own write lock, so a busy tenant doesn't stall the others. Shards are SQLite-only: the
+# postgresql backend keeps every team in its one database.
+
+MAIN_SHARD = "main"
+DEFAULT_TEAM_ID = 1
+
+TEAMS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS teams(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slug TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        shard TEXT,
+        created_at TEXT NOT NULL DEFAULT (DATETIME('now'))
+    )
+    """,
+    f"INSERT OR IGNORE INTO teams (id, slug, name) VALUES ({DEFAULT_TEAM_ID}, 'default', 'Default team')",
+    # constant defaults: existing rows join the default team without being rewritten
+    f"ALTER TABLE users ADD COLUMN team_id INTEGER NOT NULL DEFAULT {DEFAULT_TEAM_ID}",
+    f"ALTER TABLE tasks ADD COLUMN team_id INTEGER NOT NULL DEFAULT {DEFAULT_TEAM_ID}",
+    # dashboard / /api/users: a team's members
+    "CREATE INDEX IF NOT EXISTS idx_users_team ON users(team_id)",
+]
+
+
+class UnknownShard(Exception):
+    pass
+
+
+class ShardRouter:
+    """
+    Team id -> shard name -> store (repository.SQLiteStore). One per app (app.extensions["shards"]).
+    A team's shard is fixed when the team is created, so lookups are cached for the
+    life of the process.
+    """
+
+    def __init__(self, main_store, shard_stores=None):
+        self.stores = {MAIN_SHARD: main_store}
+        self.stores.update(shard_stores or {})
+        self._team_shards = {}
+        self._lock = threading.Lock()
+
+    @property
+    def main(self):
+        return self.stores[MAIN_SHARD]
+
+    def shard_of(self, team_id):
+        shard = self._team_shards.get(team_id)
+        if shard is not None:
+            return shard
+        with self.main.session() as repo:
+            shard = repo.team_shard(team_id) or MAIN_SHARD
+        if shard not in self.stores:
+            raise UnknownShard(f"Team {team_id} is mapped to shard {shard!r}, which is not in SHARDS")
+        with self._lock:
+            self._team_shards[team_id] = shard
+        return shard
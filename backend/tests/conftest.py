@@ -0,0 +1,125 @@
+import os
+import sys
+
+import pytest
+
+# the backend is a flat set of modules (app.py imports `repository`, not `backend.repository`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionPool
+from repository import SQLiteStore
+from tenancy import DEFAULT_TEAM_ID
+
+# -----------------------
+# Stores
+# -----------------------
+# Repository tests run against every backend: SQLite always, PostgreSQL when DATABASE_URL
+# points at a server. That database is wiped (DROP SCHEMA public CASCADE) before each test,
+# so give it a throwaway one, e.g.
+#     createdb taskboard_test
+#     DATABASE_URL=postgresql://localhost/taskboard_test python -m pytest tests
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+BACKENDS = [
+    "sqlite",
+    pytest.param("postgresql", marks=pytest.mark.skipif(
+        not DATABASE_URL, reason="set DATABASE_URL to a throwaway PostgreSQL database")),
+]
+
+
+def _reset_postgres(url):
+    import psycopg
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+
+
+@pytest.fixture
+def fresh_store(request, tmp_path):
+    """An empty database of the parametrised backend, schema not created yet."""
+    if request.param == "postgresql":
+        pytest.importorskip("psycopg_pool")
+        from postgres import PostgresStore
+        _reset_postgres(DATABASE_URL)
+        store = PostgresStore(DATABASE_URL, max_size=4)
+        yield store
+        store.close()
+    else:
+        pool = ConnectionPool(str(tmp_path / "test.db"), size=4)
+        yield SQLiteStore(pool)
+        pool.close_all()
+
+
+@pytest.fixture
+def store(fresh_store):
+    fresh_store.prepare()
+    return fresh_store
+
+
+@pytest.fixture
+def repo(store):
+    with store.session() as repo:
+        yield repo
+
+
+@pytest.fixture
+def users(repo):
+    """Two members of the default team: (alice, bob) rows."""
+    with repo.transaction():
+        alice = repo.create_user("alice", "Alice Smith", "alice@example.com", "!", DEFAULT_TEAM_ID)
+        bob = repo.create_user("bob", "Bob Jones", "bob@example.com", "!", DEFAULT_TEAM_ID)
+    return alice, bob
+
+
+# -----------------------
+# App
+# -----------------------
+@pytest.fixture
+def app_config():
+    """Config overrides for `app`: override this fixture in a test module."""
+    return {}
+
+
+@pytest.fixture
+def make_app(tmp_path, app_config):
+    """Build Flask apps on the test's SQLite database (another app on the same file stands in for
+    another worker process); their workers are stopped after the test."""
+    from app import create_app
+    apps = []
+
+    def make(**overrides):
+        app = create_app({"TESTING": True, "DB_PATH": str(tmp_path / "app.db"), "SEED_SAMPLE_USERS": True,
+                          "ADMISSION_ENABLED": False, "PASSWORD_SCRYPT_N": 1024, **app_config, **overrides})
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        for worker in [*app.extensions["writers"].values(), *app.extensions["events"].values(),
+                       *app.extensions["backfills"].values(), app.extensions["outbox"],
+                       app.extensions["reset_janitor"]]:
+            worker.stop()
+        app.extensions["hasher"].shutdown()
+        app.extensions["db_pool"].close_all()
+
+
+@pytest.fixture
+def app(make_app):
+    """The Flask app on a fresh SQLite database with the demo accounts; TESTING turns the plan guard on."""
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as john_doe."""
+    client = app.test_client()
+    response = client.post("/login", data={"username": "john_doe", "password": "Password123!"})
+    assert response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
+    return client
+
+
+def pytest_generate_tests(metafunc):
+    # every test using a store runs once per backend
+    if "fresh_store" in metafunc.fixturenames:
+        metafunc.parametrize("fresh_store", BACKENDS, indirect=True)
+
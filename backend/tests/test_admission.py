@@ -0,0 +1,57 @@
+import pytest
+
+# Admission control on the auth POSTs (admission.py): an empty token bucket is a 429, no free
+# auth slot a 503, both with Retry-After and without running the view. An admitted login with
+# a wrong password is redirected back to the form (302).
+
+
+@pytest.fixture
+def app_config():
+    # buckets that don't refill during a test: 0.01 tokens/s is one every 100 s
+    return {"ADMISSION_ENABLED": True, "ADMISSION_IP_RATE": 0.01, "ADMISSION_IP_BURST": 3,
+            "ADMISSION_ACCOUNT_RATE": 0.01, "ADMISSION_ACCOUNT_BURST": 2,
+            "ADMISSION_MAX_CONCURRENT": 1, "ADMISSION_QUEUE_TIMEOUT": 0.01}
+
+
+def login(client, username, ip="10.0.0.1"):
+    return client.post("/login", data={"username": username, "password": "wrong"},
+                       environ_base={"REMOTE_ADDR": ip})
+
+def test_client_ip_bucket(app):
+    client = app.test_client()
+    for username in ("a", "b", "c"):
+        assert login(client, username).status_code == 302
+    response = login(client, "d")
+    assert response.status_code == 429 and response.headers["Retry-After"] == "100"
+    assert "network" in response.get_json()["message"]
+    # the same bucket covers every auth endpoint; other clients have their own
+    assert client.post("/forgot-password", data={"email": "x@example.com"},
+                       environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code == 429
+    assert login(client, "d", ip="10.0.0.2").status_code == 302
+    assert app.extensions["admission"].rejected_ip == 2
+
+def test_account_bucket(app):
+    client = app.test_client()
+    assert login(client, "john_doe", ip="10.0.0.1").status_code == 302
+    assert login(client, "John_Doe", ip="10.0.0.2").status_code == 302
+    response = login(client, "john_doe", ip="10.0.0.3")
+    assert response.status_code == 429 and response.headers["Retry-After"] == "100"
+    assert "account" in response.get_json()["message"]
+    # the right password can't get past it either, but other accounts can
+    blocked = client.post("/login", data={"username": "john_doe", "password": "Password123!"},
+                          environ_base={"REMOTE_ADDR": "10.0.0.4"})
+    assert blocked.status_code == 429
+    assert login(client, "alice_smith", ip="10.0.0.4").status_code == 302
+
+def test_no_free_auth_slot_is_503(app):
+    admission = app.extensions["admission"]
+    client = app.test_client()
+    assert admission._slots.acquire(timeout=1)  # a slow login holds the only slot
+    try:
+        response = login(client, "john_doe")
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+        assert admission.rejected_busy == 1
+    finally:
+        admission._slots.release()
+    assert login(client, "john_doe").status_code == 302
+    assert admission.stats()["in_flight"] == 0
@@ -0,0 +1,72 @@
+import json
+import threading
+
+from repository import TASK_FIELDS
+
+# JSON routes through the Flask test client (SQLite, plan guard on; see conftest.app).
+
+
+def published(app, after=0):
+    with app.extensions["shards"].main.session() as repo:
+        return [(kind, owner_id, json.loads(data)) for _, kind, owner_id, data in repo.events_after(after)]
+
+def test_bulk_add_and_batch_move_publish_one_event_per_task(app, client):
+    # john_doe is user 1, alice_smith user 2 (seed order)
+    response = client.post("/api/tasks/bulk", json={"tasks": [{"title": "Mine", "day": "Tuesday"},
+                                                              {"title": "Hers", "assigned_to": 2}]})
+    mine, hers = [result["id"] for result in response.get_json()["results"]]
+    assert published(app) == [
+        ("task.added", 1, {"task_id": mine, "title": "Mine", "day": "Tuesday", "status": "todo"}),
+        ("task.added", 2, {"task_id": hers, "title": "Hers", "day": "Monday", "status": "todo"}),
+    ]
+
+    with app.extensions["shards"].main.session() as repo:
+        after = repo.latest_event_id()
+    response = client.post("/api/tasks/batch-move", json={"task_ids": [mine, hers, 999999], "status": "done"})
+    assert [result["success"] for result in response.get_json()["results"]] == [True, True, False]
+    assert published(app, after) == [("task.moved", 1, {"task_id": mine, "status": "done"}),
+                                     ("task.moved", 2, {"task_id": hers, "status": "done"})]
+    # only the owners' boards were invalidated, and they show the move
+    assert [task["status"] for task in client.get("/api/tasks").get_json()["tasks"]] == ["done"]
+
+def test_move_needs_post(client):
+    task_id = client.post("/api/tasks/bulk", json={"tasks": [{"title": "Stay"}]}).get_json()["results"][0]["id"]
+    for headers in ({}, {"Accept": "application/json"}):
+        response = client.get(f"/move/{task_id}/done", headers=headers)
+        assert response.status_code == 405 and set(response.allow) == {"OPTIONS", "POST"}
+    assert client.get("/api/tasks").get_json()["tasks"][0]["status"] == "todo"
+
+    response = client.post(f"/move/{task_id}/done", headers={"Accept": "application/json"})
+    assert response.get_json()["task"]["status"] == "done"
+    assert client.post(f"/task/move/{task_id}/todo").status_code == 302
+
+def test_update_and_delete_return_the_api_task_fields(client):
+    task_id = client.post("/api/tasks/bulk", json={"tasks": [{"title": "Old"}]}).get_json()["results"][0]["id"]
+    updated = client.post(f"/update/{task_id}", json={"name": "New"}).get_json()["task"]
+    assert set(updated) == set(TASK_FIELDS) and updated["title"] == "New"
+    deleted = client.post(f"/task/delete/{task_id}", headers={"Accept": "application/json"}).get_json()["task"]
+    assert set(deleted) == set(TASK_FIELDS) and deleted["id"] == task_id
+
+def test_pool_size_concurrent_timer_starts(make_app):
+    # each request holds one of the two pooled connections while it waits on the writer,
+    # which has to commit their batch on a connection of its own
+    app = make_app(DB_POOL_SIZE=2, DB_POOL_TIMEOUT=1.0, WRITER_MAX_DELAY=0.3)
+    clients = [app.test_client() for _ in range(2)]
+    for client in clients:
+        client.post("/login", data={"username": "john_doe", "password": "Password123!"})
+    response = clients[0].post("/api/tasks/bulk", json={"tasks": [{"title": "One"}, {"title": "Two"}]})
+    task_ids = [result["id"] for result in response.get_json()["results"]]
+
+    responses = [None] * len(clients)
+
+    def start(i):
+        responses[i] = clients[i].post(f"/timer/start/{task_ids[i]}")
+    threads = [threading.Thread(target=start, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert [(r.status_code, r.get_json()["success"]) for r in responses] == [(200, True), (200, True)]
+    with app.extensions["shards"].main.session() as repo:
+        running = repo.conn.execute("SELECT task_id FROM time_entries WHERE end_time IS NULL").fetchall()
+    assert sorted(row[0] for row in running) == sorted(task_ids)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+
+import pytest
+
+from asgi import AsgiApp
+
+# asgi.AsgiApp driven directly with fake receive/send callables, as an ASGI server would.
+
+BUFFER = 4096
+MAX_BODY = 64 * 1024
+
+
+@pytest.fixture
+def app_config():
+    return {"ASGI_RESPONSE_BUFFER": BUFFER, "ASGI_MAX_BODY": MAX_BODY, "ASGI_VIEW_THREADS": 2,
+            "EVENTS_POLL_INTERVAL": 0.05}
+
+
+@pytest.fixture
+def asgi(app):
+    asgi = AsgiApp(app)
+    yield asgi
+    asgi.executor.shutdown()
+
+
+class Client:
+    """One request/response exchange: the body goes in `chunks`, then receive() waits for `gone`."""
+
+    def __init__(self, method, path, body=b"", headers=(), query=b"", chunks=None, content_length=True):
+        headers = [(b"host", b"test"), *headers]
+        if body and content_length:
+            headers.append((b"content-length", str(len(body)).encode()))
+        self.scope = {"type": "http", "method": method, "path": path, "query_string": query,
+                      "headers": headers, "http_version": "1.1", "scheme": "http",
+                      "server": ("test", 80), "client": ("127.0.0.1", 50000), "root_path": ""}
+        chunks = chunks or [body]
+        self.incoming = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                         for i, chunk in enumerate(chunks)]
+        self.sent = []
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        if self.incoming:
+            return self.incoming.pop(0)
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def __call__(self, asgi):
+        await asgi(self.scope, self.receive, self.send)
+        self.gone.set()
+        return self
+
+    @property
+    def status(self):
+        return self.sent[0]["status"]
+
+    @property
+    def headers(self):
+        return dict(self.sent[0]["headers"])
+
+    @property
+    def bodies(self):
+        return [message for message in self.sent[1:] if message["type"] == "http.response.body"]
+
+    @property
+    def body(self):
+        return b"".join(message.get("body", b"") for message in self.bodies)
+
+
+async def login(asgi):
+    client = await Client("POST", "/login", b"username=john_doe&password=Password123%21",
+                          [(b"content-type", b"application/x-www-form-urlencoded")])(asgi)
+    assert client.status == 302
+    return (b"cookie", client.headers[b"set-cookie"].split(b";")[0])
+
+async def add_tasks(asgi, cookie, count, size=200):
+    body = json.dumps({"tasks": [{"title": f"Task {i}", "description": "d" * size} for i in range(count)]}).encode()
+    client = await Client("POST", "/api/tasks/bulk", body, [cookie, (b"content-type", b"application/json")])(asgi)
+    assert client.status == 200 and client.body and json.loads(client.body)["created"] == count
+
+
+def test_buffered_get(asgi):
+    async def main():
+        cookie = await login(asgi)
+        client = await Client("GET", "/api/users", headers=[cookie])(asgi)
+        assert client.status == 200
+        # small enough for the buffer: sent in one message, from the event loop
+        assert len(client.bodies) == 1 and not client.bodies[0].get("more_body")
+        assert sorted(user["username"] for user in json.loads(client.body)) == ["alice_smith", "john_doe", "robert_johnson"]
+    asyncio.run(main())
+    assert asgi.stats()["connections"] == 0 and asgi.stats()["views_in_flight"] == 0
+
+def test_response_over_the_buffer_is_streamed(asgi, app):
+    async def main():
+        cookie = await login(asgi)
+        await add_tasks(asgi, cookie, 60)
+        client = await Client("GET", "/api/tasks", headers=[cookie], query=b"limit=100")(asgi)
+        assert client.status == 200 and len(client.body) > BUFFER
+        assert [message.get("more_body", False) for message in client.bodies][-1] is False
+        assert all(message["more_body"] for message in client.bodies[:-1]) and len(client.bodies) > 1
+        assert len(json.loads(client.body)["tasks"]) == 60
+    asyncio.run(main())
+    assert asgi.stats()["unbuffered_responses"] == 0
+    assert app.extensions["db_pool"].stats()["in_use"] == 0
+
+def test_oversized_body_is_413(asgi):
+    async def main():
+        declared = await Client("POST", "/api/tasks/bulk", b"x" * (MAX_BODY + 1))(asgi)
+        assert declared.status == 413
+        # no Content-Length: counted as the chunks arrive
+        chunked = await Client("POST", "/api/tasks/bulk", chunks=[b"x" * (MAX_BODY // 2)] * 3)(asgi)
+        assert chunked.status == 413
+    asyncio.run(main())
+
+def test_client_disconnect_mid_stream(asgi, app):
+    async def main():
+        cookie = await login(asgi)
+        await add_tasks(asgi, cookie, 200)
+        client = Client("GET", "/api/tasks", headers=[cookie], query=b"limit=200")
+        original = client.send
+
+        async def send(message):
+            await original(message)
+            if message["type"] == "http.response.body":
+                # the client goes away after the first chunk
+                client.gone.set()
+                await asyncio.sleep(0.05)
+        client.send = send
+        await client(asgi)
+        return client
+    client = asyncio.run(main())
+    # the view thread stopped sending: no final (more_body False) message
+    assert client.bodies and all(message.get("more_body") for message in client.bodies)
+    assert asgi.stats()["unbuffered_responses"] == 0
+    assert app.extensions["db_pool"].stats()["in_use"] == 0
+
+def test_events_subscription_receives_published_event(asgi):
+    async def main():
+        cookie = await login(asgi)
+        subscriber = Client("GET", "/events", headers=[cookie])
+        stream = asyncio.ensure_future(subscriber(asgi))
+        while not subscriber.bodies:
+            await asyncio.sleep(0.01)
+        assert subscriber.status == 200 and subscriber.body.startswith(b"retry:")
+        assert asgi.stats()["event_streams"] == 1
+
+        await add_tasks(asgi, cookie, 1)
+        for _ in range(200):
+            if b"event: task.added" in subscriber.body:
+                break
+            await asyncio.sleep(0.01)
+        assert b'"title":"Task 0"' in subscriber.body
+
+        subscriber.gone.set()
+        await asyncio.wait_for(stream, 5)
+    asyncio.run(main())
+    assert asgi.stats()["event_streams"] == 0 and asgi.stats()["connections"] == 0
+
+def test_events_needs_login(asgi):
+    client = asyncio.run(Client("GET", "/events")(asgi))
+    assert client.status == 401
@@ -0,0 +1,55 @@
+import pytest
+
+# The read-through cache (cache.py): a cached user directory or board is served until its
+# change_versions scope moves, whether the write happened in this app or in another one on the
+# same database (standing in for another worker process).
+
+SIGNUP = {"username": "new_member", "full_name": "New Member", "email": "new@example.com",
+          "password": "Password123!", "confirm_password": "Password123!"}
+
+
+def login(app):
+    client = app.test_client()
+    response = client.post("/login", data={"username": "john_doe", "password": "Password123!"})
+    assert response.status_code == 302
+    return client
+
+def usernames(client):
+    return sorted(user["username"] for user in client.get("/api/users").get_json())
+
+@pytest.fixture(params=["memory", "sqlite"])
+def app_config(request):
+    return {"CACHE_BACKEND": request.param}
+
+def test_board_is_reloaded_after_a_task_write(app, client):
+    cache = app.extensions["cache"]
+    client.get("/dashboard")
+    hits = cache.hits
+    assert client.get("/dashboard").status_code == 200
+    assert cache.hits > hits
+
+    client.post("/task/add", data={"title": "Fresh from the form", "day": "Monday"})
+    misses = cache.misses
+    assert b"Fresh from the form" in client.get("/dashboard").data
+    assert cache.misses > misses
+
+def test_user_list_is_reloaded_after_a_signup_in_this_app(app, client):
+    before = usernames(client)
+    hits = app.extensions["cache"].hits
+    assert usernames(client) == before
+    assert app.extensions["cache"].hits > hits
+
+    assert app.test_client().post("/signup", data=SIGNUP).status_code == 302
+    assert usernames(client) == sorted(before + ["new_member"])
+
+def test_writes_by_another_app_invalidate_the_cache(app, client, make_app):
+    other = make_app(SEED_SAMPLE_USERS=False)
+    before = usernames(client)
+    usernames(client)  # cached now
+
+    assert other.test_client().post("/signup", data=SIGNUP).status_code == 302
+    assert usernames(client) == sorted(before + ["new_member"])
+
+    client.get("/dashboard")
+    login(other).post("/task/add", data={"title": "Added by the other worker", "day": "Monday"})
+    assert b"Added by the other worker" in client.get("/dashboard").data
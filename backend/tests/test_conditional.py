@@ -0,0 +1,40 @@
+# Conditional GET on the JSON reads: ETag / Last-Modified from change_versions, 304 while unchanged.
+
+SIGNUP = {"username": "new_member", "full_name": "New Member", "email": "new@example.com",
+          "password": "Password123!", "confirm_password": "Password123!"}
+
+
+def revalidate(client, path):
+    """200 with validators, then 304 for either kind of conditional request. Returns the ETag."""
+    first = client.get(path)
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    by_etag = client.get(path, headers={"If-None-Match": etag})
+    assert by_etag.status_code == 304 and by_etag.data == b"" and by_etag.headers["ETag"] == etag
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 304
+    return etag
+
+def test_tasks_304_until_a_task_write(client):
+    client.post("/task/add", data={"title": "First", "day": "Monday"})
+    etag = revalidate(client, "/api/tasks")
+
+    client.post("/task/add", data={"title": "Second", "day": "Monday"})
+    changed = client.get("/api/tasks", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.get_json()["tasks"]) == 2
+    assert revalidate(client, "/api/tasks") == changed.headers["ETag"]
+
+def test_users_304_until_a_user_write(app, client):
+    etag = revalidate(client, "/api/users")
+
+    assert app.test_client().post("/signup", data=SIGNUP).status_code == 302
+    changed = client.get("/api/users", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert "new_member" in [user["username"] for user in changed.get_json()]
+
+def test_other_users_writes_keep_my_tasks_fresh(client):
+    client.post("/task/add", data={"title": "Mine", "day": "Monday"})
+    etag = revalidate(client, "/api/tasks")
+    # john_doe (1) assigns alice_smith (2) a task: only her board changes
+    client.post("/api/tasks/bulk", json={"tasks": [{"title": "Hers", "assigned_to": 2}]})
+    assert client.get("/api/tasks", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+# /metrics (metrics.py): a request shows up in its endpoint's latency, count and SQL series,
+# per process or summed over every worker's file with METRICS_MULTIPROC_DIR.
+
+TASKS = '{endpoint="api_tasks",method="GET"}'
+
+
+@pytest.fixture(params=["process", "multiproc"])
+def app_config(request, tmp_path):
+    if request.param == "multiproc":
+        return {"METRICS_MULTIPROC_DIR": str(tmp_path / "metrics")}
+    return {}
+
+
+def scrape(client):
+    """{series: value} for every sample line of /metrics."""
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+def test_request_is_in_latency_and_sql_series(app, client):
+    client.post("/task/add", data={"title": "Counted", "day": "Monday"})
+    response = client.get("/api/tasks")
+    assert response.status_code == 200
+    task_id = response.get_json()["tasks"][0]["id"]
+
+    samples = scrape(client)
+    assert samples['http_requests_total{endpoint="api_tasks",method="GET",status="200"}'] == 1
+    assert samples[f"http_request_duration_seconds_count{TASKS}"] == 1
+    assert samples[f"http_request_duration_seconds_sum{TASKS}"] > 0
+    assert samples['http_request_duration_seconds_bucket{endpoint="api_tasks",method="GET",le="+Inf"}'] == 1
+    assert samples[f"sqlite_statements_per_request_count{TASKS}"] == 1
+    assert samples[f"sqlite_statements_per_request_sum{TASKS}"] >= 1
+    assert samples[f"sqlite_time_per_request_seconds_sum{TASKS}"] > 0
+    assert any(series.split("{")[0] == "db_pool_size" for series in samples)
+
+    # a timer write is committed by the writer thread, and still charged to its request:
+    # the intent's statements plus its batch's BEGIN IMMEDIATE, savepoint and COMMIT
+    assert client.post(f"/timer/start/{task_id}").get_json()["success"]
+    timer = '{endpoint="timer_start",method="POST"}'
+    samples = scrape(client)
+    assert samples[f"sqlite_statements_per_request_sum{timer}"] >= 5
+    assert samples[f"sqlite_write_lock_wait_seconds_count{timer}"] == 1
+    assert samples[f"sqlite_write_lock_wait_seconds_sum{timer}"] > 0
+
+    multiproc_dir = app.config["METRICS_MULTIPROC_DIR"]
+    if multiproc_dir:
+        # another worker's file (same traffic) is summed in; its gauges are labelled by pid
+        [own] = os.listdir(multiproc_dir)
+        with open(os.path.join(multiproc_dir, own)) as f:
+            snapshot = json.load(f)
+        with open(os.path.join(multiproc_dir, "metrics-99999.json"), "w") as f:
+            json.dump(snapshot, f)
+        samples = scrape(client)
+        assert samples[f"http_request_duration_seconds_count{TASKS}"] == 2
+        assert samples[f"sqlite_statements_per_request_count{TASKS}"] == 2
+        assert 'db_pool_size{pid="99999"}' in samples
@@ -0,0 +1,101 @@
+import socketserver
+import threading
+
+import pytest
+
+from mailer import OutboxWorker
+from smtp_transport import SMTPSession, SMTPTransport
+
+# The outbox worker end to end: rows queued in the database, delivered over SMTPTransport to
+# an in-process SMTP server, then marked sent, rescheduled or failed.
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: no extensions (so no STARTTLS), no AUTH."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 outbox-test ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            if not line:
+                return
+            verb = line.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 outbox-test")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if "@bounce.example" in line:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(line.split(":", 1)[1].strip(" <>"))
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (data := self.rfile.readline()) not in (b".\r\n", b""):
+                    lines.append(data)
+                self.server.messages.append((recipients, b"".join(lines).decode()))
+                self.reply("250 Queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def worker(store, smtp_server):
+    host, port = smtp_server.server_address
+    transport = SMTPTransport(SMTPSession(host, port, "", ""), "noreply@example.com")
+    yield OutboxWorker(store, transport, max_attempts=2, backoff_base=0)
+    transport.close()
+
+
+def outbox(repo):
+    return {row["recipient"]: row for row in repo.conn.execute("SELECT * FROM email_outbox")}
+
+
+def test_outbox_sends_retries_and_fails(repo, worker, smtp_server):
+    with repo.transaction():
+        repo.enqueue_email("alice@example.com", "Hello", "plain body", "<p>html body</p>")
+        repo.enqueue_email("bob@example.com", "Hello", "plain body")
+        repo.enqueue_email("nobody@bounce.example", "Hello", "plain body")
+
+    assert worker.deliver_batch() == 3
+    rows = outbox(repo)
+    assert rows["alice@example.com"]["status"] == "sent" and rows["alice@example.com"]["sent_at"]
+    assert rows["bob@example.com"]["status"] == "sent"
+    bounced = rows["nobody@bounce.example"]
+    assert (bounced["status"], bounced["attempts"]) == ("pending", 1)
+    assert "No such user" in bounced["last_error"]
+    assert sorted(recipients[0] for recipients, _ in smtp_server.messages) == \
+        ["alice@example.com", "bob@example.com"]
+    assert any("html body" in message for _, message in smtp_server.messages)
+
+    # backoff_base=0: the retry is due at once, and it is the last attempt
+    assert worker.deliver_batch() == 1
+    bounced = outbox(repo)["nobody@bounce.example"]
+    assert (bounced["status"], bounced["attempts"]) == ("failed", 2)
+    assert worker.deliver_batch() == 0
+    # every message and batch went over one SMTP connection
+    assert smtp_server.connections == 1
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from passwords import HasherBusy, PasswordHasher, hash_password
+
+# Password hashing off the request threads (passwords.PasswordHasher).
+
+
+def test_verify_dummy_costs_a_real_verify():
+    hasher = PasswordHasher(params={"n": 2 ** 14})
+    try:
+        stored = hash_password("secret", n=2 ** 14)
+        assert hasher.verify(stored, "secret") and not hasher.verify(stored, "wrong")
+        assert hasher.verify_dummy("secret") is False
+        started = time.perf_counter()
+        hasher.verify(stored, "wrong")
+        real = time.perf_counter() - started
+        started = time.perf_counter()
+        hasher.verify_dummy("wrong")
+        dummy = time.perf_counter() - started
+        assert dummy > real / 3
+    finally:
+        hasher.shutdown()
+
+def test_login_hashes_for_unknown_usernames(app, monkeypatch):
+    calls = []
+    hasher = app.extensions["hasher"]
+    monkeypatch.setattr(hasher, "verify_dummy", lambda password: calls.append(password) or False)
+    client = app.test_client()
+    response = client.post("/login", data={"username": "nobody", "password": "guess"})
+    assert response.status_code == 302 and response.headers["Location"].endswith("/login")
+    assert calls == ["guess"]
+
+def test_timeout_is_busy_not_an_error():
+    hasher = PasswordHasher(params={"n": 2 ** 14}, workers=1, timeout=0.05)
+    try:
+        release = threading.Event()
+        blocker = hasher._submit(release.wait)
+        with pytest.raises(HasherBusy):
+            hasher.hash("secret")
+        assert hasher.stats()["timed_out"] == 1
+        release.set()
+        blocker.result()
+        # the queued hash was cancelled, not run; the pool is usable again
+        hasher.timeout = 10.0
+        assert hasher.verify(hash_password("secret", n=2 ** 14), "secret")
+    finally:
+        hasher.shutdown()
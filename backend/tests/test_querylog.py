@@ -0,0 +1,52 @@
+import pytest
+from flask import g
+
+from app import get_conn, write_intent
+from querylog import QueryPlanError, full_scans
+
+# The plan guard: with TESTING on, a statement on a request's connection that full-scans a
+# guarded table fails the request.
+
+
+def test_full_scans_resolves_aliases():
+    sql = "SELECT * FROM time_entries te JOIN tasks t ON t.id = te.task_id"
+    plan = ["SCAN te", "SEARCH t USING INTEGER PRIMARY KEY (rowid=?)"]
+    assert full_scans(sql, plan) == ["time_entries"]
+    assert full_scans("SELECT * FROM users", ["SCAN users"]) == []
+
+def test_guard_raises_on_unindexed_query(app):
+    with app.test_request_context():
+        conn = get_conn()
+        # idx_tasks_user_status_created_ts answers this one
+        conn.execute("SELECT id FROM tasks WHERE user_id = ?", (1,)).fetchall()
+        # nothing indexes description
+        with pytest.raises(QueryPlanError, match="full scan of tasks"):
+            conn.execute("SELECT id FROM tasks WHERE description = ?", ("x",))
+
+def test_guard_ignores_connections_outside_requests(app):
+    with app.test_request_context():
+        get_conn()  # creates the schema
+    # CLI commands and background workers use their own connections: not guarded
+    with app.extensions["shards"].main.session() as repo:
+        repo.conn.execute("SELECT id FROM tasks WHERE description = ?", ("x",)).fetchall()
+
+def test_routes_pass_the_guard(client):
+    assert client.post("/task/add", data={"title": "T1", "day": "Monday"}).status_code == 302
+    for path in ["/dashboard", "/timesheet", "/report/weekly", "/api/tasks", "/api/tasks/search?q=t1",
+                 "/api/users"]:
+        assert client.get(path).status_code == 200, path
+
+def test_guard_covers_writer_intents(app, client):
+    task_id = client.post("/api/tasks/bulk", json={"tasks": [{"title": "Timed"}]}).get_json()["results"][0]["id"]
+    assert client.post(f"/timer/start/{task_id}").get_json()["success"]
+    assert client.post(f"/timer/stop/{task_id}").get_json()["success"]
+
+    def unindexed(repo):
+        return repo.conn.execute("SELECT id FROM tasks WHERE description = ?", ("x",)).fetchall()
+    with app.test_request_context():
+        g.sql_stats = [0, 0.0, 0.0]
+        with pytest.raises(QueryPlanError, match="full scan of tasks"):
+            write_intent(unindexed)
+        # the intent ran on the writer's connection but counts towards this request, as do
+        # its batch's BEGIN IMMEDIATE, SAVEPOINT, ROLLBACK TO, RELEASE and COMMIT
+        assert g.sql_stats[0] == 1 + 5
@@ -0,0 +1,370 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from repository import SQLiteRepository, TASK_FIELDS
+from tenancy import DEFAULT_TEAM_ID
+
+# The same repository contract on every backend (see conftest.BACKENDS).
+
+
+def run(repo, statement, *params):
+    """Test-only SQL on the repository's connection, written with ? placeholders."""
+    if not isinstance(repo, SQLiteRepository):
+        statement = statement.replace("?", "%s")
+    return repo.conn.execute(statement, params)
+
+def this_week():
+    # tasks are stamped with the database's clock (UTC)
+    today = datetime.now(timezone.utc).date()
+    monday = today - timedelta(days=today.weekday())
+    return monday, monday + timedelta(days=6)
+
+def add_task(repo, user, title="Task", description=None, day="Monday"):
+    with repo.transaction():
+        return repo.add_task(title, description, "medium", None, day, user["id"], DEFAULT_TEAM_ID)["id"]
+
+def build_report(totals):
+    return {"hours_worked": round(totals["minutes"] / 60, 2), "tasks_total": totals["tasks_total"],
+            "tasks_done": totals["tasks_done"], "completion_rate": 0.0, "rating": 0.0}
+
+
+# -----------------------
+# Schema
+# -----------------------
+def test_migrate_is_repeatable(store):
+    store.prepare()
+    with store.session() as repo:
+        assert run(repo, "SELECT COUNT(*) AS n FROM teams").fetchone()["n"] == 1
+
+def test_concurrent_migrations_apply_each_version_once(fresh_store):
+    if fresh_store.backend == "postgresql":
+        from postgres import migrate, MIGRATIONS
+    else:
+        from migrations import migrate, MIGRATIONS
+    applied, errors = [], []
+
+    def worker():
+        conn = fresh_store.acquire()
+        try:
+            applied.extend(migrate(conn))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            fresh_store.release(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert sorted(applied) == [version for version, _, _ in MIGRATIONS]
+
+
+# -----------------------
+# Users and teams
+# -----------------------
+def test_users_and_teams(repo, users):
+    alice, bob = users
+    assert repo.user_by_username("alice")["email"] == "alice@example.com"
+    assert repo.user_by_email("bob@example.com")["id"] == bob["id"]
+    assert repo.user_exists("alice", "nobody@example.com")
+    assert not repo.user_exists("carol", "carol@example.com")
+    assert repo.user_team_id(alice["id"]) == DEFAULT_TEAM_ID
+    assert [m["username"] for m in repo.team_members(DEFAULT_TEAM_ID)] == ["alice", "bob"]
+
+    with repo.transaction():
+        team_id = repo.create_team("ops", "Operations")
+        repo.set_user_team(bob["id"], team_id)
+    assert repo.team_by_slug("ops")["id"] == team_id
+    assert repo.team_shard(team_id) is None
+    assert [m["username"] for m in repo.team_members(team_id)] == ["bob"]
+
+def test_password_hash_compare_and_set(repo, users):
+    alice, _ = users
+    with repo.transaction():
+        assert repo.replace_password_hash(alice["id"], "!", "new")
+        assert not repo.replace_password_hash(alice["id"], "!", "newer")
+    assert repo.user_by_username("alice")["password_hash"] == "new"
+
+
+# -----------------------
+# Tasks
+# -----------------------
+def test_add_tasks_returns_ids_in_input_order(repo, users):
+    alice, bob = users
+    rows = [(f"Task {i}", None, "low", 1.5, "Monday", (alice, bob)[i % 2]["id"], DEFAULT_TEAM_ID)
+            for i in range(5)]
+    with repo.transaction(immediate=True):
+        ids = repo.add_tasks(rows)
+    assert len(set(ids)) == 5
+    for task_id, row in zip(ids, rows):
+        task = repo.team_task(task_id, DEFAULT_TEAM_ID)
+        assert task["user_id"] == row[5]
+    assert [t["title"] for t in repo.board(alice["id"])] == ["Task 0", "Task 2", "Task 4"]
+
+def test_board_and_task_page_order(repo, users):
+    alice, _ = users
+    ids = [add_task(repo, alice, f"Task {i}") for i in range(5)]
+    with repo.transaction():
+        repo.move_task(ids[0], "done", DEFAULT_TEAM_ID, datetime.now())
+        repo.move_task(ids[1], "inprogress", DEFAULT_TEAM_ID, datetime.now())
+    board = [t["id"] for t in repo.board(alice["id"])]
+    assert board[-2:] == [ids[1], ids[0]]
+
+    seen, cursor = [], None
+    while True:
+        page = list(repo.task_page(alice["id"], {}, cursor, limit=2))
+        if not page:
+            break
+        seen += [row["id"] for row in page]
+        last = page[-1]
+        cursor = (last["status_rank"], last["created_ts"], last["id"])
+    assert sorted(seen) == sorted(ids) and len(seen) == 5
+    assert set(dict(last)) == set(TASK_FIELDS) | {"username", "full_name", "status_rank", "created_ts"}
+    assert [row["id"] for row in repo.task_page(alice["id"], {"status": "done"})] == [ids[0]]
+
+def test_rename_and_delete_are_team_scoped(repo, users):
+    alice, _ = users
+    task_id = add_task(repo, alice)
+    with repo.transaction():
+        assert repo.rename_task(task_id, DEFAULT_TEAM_ID + 1, "Nope", datetime.now()) is None
+        assert repo.rename_task(task_id, DEFAULT_TEAM_ID, "Renamed", datetime.now())["title"] == "Renamed"
+        assert repo.delete_task(task_id, DEFAULT_TEAM_ID)["id"] == task_id
+    assert repo.team_task(task_id, DEFAULT_TEAM_ID) is None
+
+def test_change_versions_follow_task_writes(repo, users):
+    alice, _ = users
+    assert repo.change_version(f"tasks:{alice['id']}") is None
+    task_id = add_task(repo, alice)
+    first = repo.change_version(f"tasks:{alice['id']}")["version"]
+    with repo.transaction():
+        repo.move_task(task_id, "inprogress", DEFAULT_TEAM_ID, datetime.now())
+    assert repo.change_version(f"tasks:{alice['id']}")["version"] > first
+    assert repo.change_version("users")["version"] >= 1
+
+def test_search_tasks(repo, users):
+    alice, bob = users
+    in_title = add_task(repo, alice, "Quarterly report", "numbers")
+    in_description = add_task(repo, alice, "Numbers", "for the report")
+    add_task(repo, alice, "Unrelated")
+    add_task(repo, bob, "Report for bob")
+    found = [row["id"] for row in repo.search_tasks(alice["id"], ["rep"], 10)]
+    assert found == [in_title, in_description]
+    assert set(dict(repo.search_tasks(alice["id"], ["rep"], 1)[0])) == set(TASK_FIELDS) | {"username", "full_name"}
+    assert [row["id"] for row in repo.search_tasks(alice["id"], ["rep"], 1, offset=1)] == [in_description]
+    assert repo.search_tasks(alice["id"], ["report", "quarter"], 10)[0]["id"] == in_title
+
+def test_move_task_to_done_closes_open_entries(repo, users):
+    alice, bob = users
+    task_id = add_task(repo, alice)
+    start = datetime(2026, 10, 12, 9, 0)
+    with repo.transaction():
+        repo.start_timer(task_id, alice["id"], start)
+        repo.start_timer(task_id, bob["id"], start + timedelta(minutes=10))
+        moved, closed = repo.move_task(task_id, "done", DEFAULT_TEAM_ID, start + timedelta(minutes=30))
+    assert moved["status"] == "done"
+    assert [(entry["user_id"], entry["duration_minutes"]) for entry in closed] == [(alice["id"], 30), (bob["id"], 20)]
+    assert repo.stop_timer(task_id, alice["id"], start + timedelta(hours=1)) is None
+    assert repo.stop_timer(task_id, bob["id"], start + timedelta(hours=1)) is None
+    with repo.transaction():
+        assert repo.move_task(task_id, "done", DEFAULT_TEAM_ID, start + timedelta(hours=1))[1] == []
+
+def test_move_tasks(repo, users):
+    alice, bob = users
+    a, b = add_task(repo, alice), add_task(repo, bob)
+    start = datetime(2026, 10, 12, 9, 0)
+    with repo.transaction():
+        repo.start_timer(a, alice["id"], start)
+        repo.start_timer(a, bob["id"], start)
+    with repo.transaction(immediate=True):
+        outcome = repo.move_tasks({a: "done", b: "inprogress", 999999: "done"}, DEFAULT_TEAM_ID,
+                                  start + timedelta(minutes=45))
+    assert outcome == {a: {"user_id": alice["id"], "closed": 2}, b: {"user_id": bob["id"], "closed": 0}, 999999: None}
+    assert {t["id"]: t["status"] for t in repo.board(alice["id"]) + repo.board(bob["id"])} == \
+        {a: "done", b: "inprogress"}
+    minutes = repo.minutes_by_day(start.date(), start.date())
+    assert minutes == {alice["id"]: {"2026-10-12": 45}, bob["id"]: {"2026-10-12": 45}}
+
+def test_move_tasks_is_team_scoped(repo, users):
+    alice, _ = users
+    task_id = add_task(repo, alice)
+    with repo.transaction(immediate=True):
+        assert repo.move_tasks({task_id: "done"}, DEFAULT_TEAM_ID + 1, datetime.now()) == {task_id: None}
+    assert repo.board(alice["id"])[0]["status"] == "todo"
+
+
+# -----------------------
+# Time entries and rollups
+# -----------------------
+def test_timer_start_stop_and_rollup(repo, users):
+    alice, bob = users
+    task_id = add_task(repo, alice)
+    start = datetime(2026, 10, 12, 9, 0)
+    with repo.transaction():
+        first = repo.start_timer(task_id, alice["id"], start)
+        # starting again stops the running timer first
+        second = repo.start_timer(task_id, alice["id"], start + timedelta(minutes=20))
+        repo.start_timer(task_id, bob["id"], start)
+    assert second != first
+    with repo.transaction():
+        stopped = repo.stop_timer(task_id, alice["id"], start + timedelta(minutes=50))
+        assert repo.stop_timer(task_id, alice["id"], start + timedelta(minutes=55)) is None
+    assert stopped["id"] == second and stopped["owner_id"] == alice["id"]
+
+    day = start.date()
+    assert repo.minutes_by_day(day, day, user_id=alice["id"]) == {"2026-10-12": 50}
+    assert repo.minutes_by_day(day, day, team_id=DEFAULT_TEAM_ID) == {alice["id"]: {"2026-10-12": 50}}
+    entries = repo.user_time_entries(alice["id"], day, day)
+    assert [(e["duration_minutes"], e["title"]) for e in entries] == [(20, "Task"), (30, "Task")]
+    assert entries[0]["start_time"] == "2026-10-12 09:00:00"
+    assert entries[0]["work_date"] == "2026-10-12"
+
+    # the rollup is derived data: a rebuild gives the same totals
+    with repo.transaction(immediate=True):
+        repo.rebuild_rollup()
+    assert repo.minutes_by_day(day, day, user_id=alice["id"]) == {"2026-10-12": 50}
+
+def test_iter_time_entries(repo, users):
+    alice, bob = users
+    task_id = add_task(repo, alice, "Payroll")
+    start = datetime(2026, 10, 12, 9, 0)
+    with repo.transaction():
+        for days in range(3):
+            repo.start_timer(task_id, alice["id"], start + timedelta(days=days))
+            repo.stop_timer(task_id, alice["id"], start + timedelta(days=days, minutes=15))
+        repo.start_timer(task_id, bob["id"], start)
+    with repo.transaction():
+        rows = [dict(r) for r in repo.iter_time_entries(start.date(), start.date() + timedelta(days=1))]
+    assert [(r["work_date"], r["full_name"], r["duration_minutes"]) for r in rows] == [
+        ("2026-10-12", "Alice Smith", 15), ("2026-10-12", "Bob Jones", None), ("2026-10-13", "Alice Smith", 15)]
+    assert rows[0]["title"] == "Payroll" and rows[0]["end_time"] == "2026-10-12 09:15:00"
+    with repo.transaction():
+        only_bob = list(repo.iter_time_entries(start.date(), start.date(), user_id=bob["id"]))
+    assert len(only_bob) == 1
+
+def test_weekly_report(repo, users):
+    alice, _ = users
+    monday, sunday = this_week()
+    ids = [add_task(repo, alice, f"Task {i}") for i in range(4)]
+    start = datetime.combine(monday, datetime.min.time()) + timedelta(hours=9)
+    with repo.transaction():
+        repo.start_timer(ids[0], alice["id"], start)
+        repo.stop_timer(ids[0], alice["id"], start + timedelta(minutes=90))
+        repo.move_task(ids[0], "done", DEFAULT_TEAM_ID, start)
+    report = repo.weekly_report(alice["id"], monday, sunday, build_report)
+    assert (report["tasks_total"], report["tasks_done"], report["hours_worked"]) == (4, 1, 1.5)
+
+    # a later change to the week shows up in the next report
+    with repo.transaction():
+        repo.move_task(ids[1], "done", DEFAULT_TEAM_ID, start)
+    assert repo.weekly_report(alice["id"], monday, sunday, build_report)["tasks_done"] == 2
+    assert repo.weekly_report(alice["id"], monday - timedelta(days=7), monday - timedelta(days=1),
+                              build_report)["tasks_total"] == 0
+
+
+# -----------------------
+# Password resets
+# -----------------------
+def test_password_reset_flow(repo, users):
+    with repo.transaction():
+        repo.create_reset("alice@example.com", "11111")
+        repo.create_reset("alice@example.com", "22222")
+    # a new OTP burns the previous one
+    assert repo.live_reset("alice@example.com", "11111") is None
+    reset = repo.live_reset("alice@example.com", "22222")
+    assert reset is not None
+    with repo.transaction():
+        repo.use_reset(reset["id"])
+        repo.set_password("alice@example.com", "hashed")
+    assert repo.live_reset("alice@example.com", "22222") is None
+    assert repo.user_by_email("alice@example.com")["password_hash"] == "hashed"
+
+def test_otp_lockout(repo, users):
+    with repo.transaction():
+        repo.create_reset("alice@example.com", "12345")
+    for _ in range(2):
+        with repo.transaction():
+            assert not repo.record_otp_failure("alice@example.com", max_attempts=3)
+    assert not repo.otp_locked("alice@example.com")
+    with repo.transaction():
+        assert repo.record_otp_failure("alice@example.com", max_attempts=3)
+    assert repo.otp_locked("alice@example.com")
+    # locking out burns the live OTP
+    assert repo.live_reset("alice@example.com", "12345") is None
+    with repo.transaction():
+        repo.clear_otp_failures("alice@example.com")
+    assert not repo.otp_locked("alice@example.com")
+
+def test_purge_expired_resets(repo, users):
+    with repo.transaction():
+        repo.create_reset("alice@example.com", "11111", minutes=0)
+        repo.create_reset("bob@example.com", "22222", minutes=10)
+        repo.record_otp_failure("alice@example.com")
+    with repo.transaction():
+        assert repo.purge_expired_resets(100) == 1
+        assert repo.purge_otp_attempts(100, lockout_minutes=0) == 1
+    assert repo.live_reset("bob@example.com", "22222") is not None
+
+
+# -----------------------
+# Email outbox
+# -----------------------
+def test_outbox_claim_and_finish(repo):
+    with repo.transaction():
+        ids = [repo.enqueue_email(f"user{i}@example.com", "Subject", "Body") for i in range(3)]
+    with repo.transaction(immediate=True):
+        claimed = repo.claim_emails(10, lease_seconds=60)
+    assert [row["id"] for row in claimed] == ids
+    assert [row["attempts"] for row in claimed] == [0, 0, 0]
+    # leased: a second worker gets nothing
+    with repo.transaction(immediate=True):
+        assert repo.claim_emails(10, lease_seconds=60) == []
+
+    with repo.transaction():
+        repo.finish_emails([ids[0]], [("try later", 0, ids[1])], [("rejected", ids[2])])
+    rows = {r["id"]: r for r in run(repo, "SELECT id, status, attempts, last_error, sent_at FROM email_outbox")}
+    assert rows[ids[0]]["status"] == "sent" and rows[ids[0]]["sent_at"] is not None
+    assert (rows[ids[1]]["status"], rows[ids[1]]["attempts"], rows[ids[1]]["last_error"]) == ("pending", 1, "try later")
+    assert (rows[ids[2]]["status"], rows[ids[2]]["last_error"]) == ("failed", "rejected")
+    # the retry is due again right away (zero delay)
+    with repo.transaction(immediate=True):
+        assert [row["id"] for row in repo.claim_emails(10, lease_seconds=60)] == [ids[1]]
+
+
+# -----------------------
+# Board events and transactions
+# -----------------------
+def test_board_events(repo):
+    assert repo.latest_event_id() == 0
+    with repo.transaction():
+        first = repo.publish_event("task.added", {"task_id": 1}, owner_id=7)
+        second = repo.publish_event("task.deleted", {"task_id": 1})
+    assert repo.latest_event_id() == second
+    assert repo.events_after(0) == [(first, "task.added", 7, '{"task_id":1}'),
+                                    (second, "task.deleted", None, '{"task_id":1}')]
+    with repo.transaction():
+        repo.prune_events(first)
+    assert [event[0] for event in repo.events_after(0)] == [second]
+    with repo.transaction():
+        repo.publish_events([("task.moved", {"task_id": 2}, 7), ("task.moved", {"task_id": 3}, 8)])
+    assert [event[1:] for event in repo.events_after(second)] == [("task.moved", 7, '{"task_id":2}'),
+                                                                  ("task.moved", 8, '{"task_id":3}')]
+
+def test_rollback_and_savepoint(repo, users):
+    alice, _ = users
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            add_task_id = repo.add_task("Gone", None, "medium", None, "Monday", alice["id"], DEFAULT_TEAM_ID)
+            raise RuntimeError(add_task_id)
+    assert repo.board(alice["id"]) == []
+
+    with repo.transaction():
+        repo.add_task("Kept", None, "medium", None, "Monday", alice["id"], DEFAULT_TEAM_ID)
+        with pytest.raises(RuntimeError):
+            with repo.savepoint():
+                repo.add_task("Undone", None, "medium", None, "Monday", alice["id"], DEFAULT_TEAM_ID)
+                raise RuntimeError()
+    assert [t["title"] for t in repo.board(alice["id"])] == ["Kept"]
@@ -0,0 +1,60 @@
+import pytest
+
+# Teams on their own shard database (tenancy.py): their boards are read from and written to
+# that file only, and a team mapped to a shard missing from SHARDS gets a clear 503.
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {"SHARDS": {"acme": str(tmp_path / "acme.db")}}
+
+
+@pytest.fixture
+def acme(app):
+    """alice_smith moved to team "acme" on the acme shard."""
+    runner = app.test_cli_runner()
+    for args in (["create-team", "acme", "Acme", "--shard", "acme"], ["assign-user", "alice_smith", "acme"]):
+        result = runner.invoke(args=args)
+        assert result.exit_code == 0, result.output
+    return app
+
+
+def login(app, username):
+    client = app.test_client()
+    response = client.post("/login", data={"username": username, "password": "Password123!"})
+    assert response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
+    return client
+
+def titles(client):
+    return [task["title"] for task in client.get("/api/tasks").get_json()["tasks"]]
+
+def test_sharded_team_reads_only_its_own_tasks(acme):
+    john, alice = login(acme, "john_doe"), login(acme, "alice_smith")
+    john.post("/task/add", data={"title": "Main board", "day": "Monday"})
+    alice.post("/task/add", data={"title": "Acme board", "day": "Monday"})
+
+    assert titles(alice) == ["Acme board"]
+    assert titles(john) == ["Main board"]
+    assert [user["username"] for user in alice.get("/api/users").get_json()] == ["alice_smith"]
+    assert b"Main board" not in alice.get("/dashboard").data
+
+    # the task was written to the shard file, not the main database
+    stores = acme.extensions["shards"].stores
+    with stores["acme"].session() as repo:
+        assert [row[0] for row in repo.conn.execute("SELECT title FROM tasks")] == ["Acme board"]
+    with stores["main"].session() as repo:
+        assert [row[0] for row in repo.conn.execute("SELECT title FROM tasks")] == ["Main board"]
+
+    # and other teams can't assign work to alice
+    response = john.post("/api/tasks/bulk", json={"tasks": [{"title": "Hers", "assigned_to": 2}]})
+    assert response.get_json()["results"][0]["success"] is False
+    assert titles(alice) == ["Acme board"]
+
+def test_team_on_a_shard_missing_from_config_is_503(acme, make_app):
+    # another worker started without the acme shard configured
+    misconfigured = make_app(SHARDS={}, SEED_SAMPLE_USERS=False)
+    alice = login(misconfigured, "alice_smith")
+    response = alice.get("/api/tasks")
+    assert response.status_code == 503
+    assert "unavailable" in response.get_json()["message"]
+    assert login(misconfigured, "john_doe").get("/api/tasks").status_code == 200
@@ -0,0 +1,62 @@
+import threading
+
+from app import get_conn
+from db import ConnectionPool
+from repository import SQLiteStore
+from tenancy import DEFAULT_TEAM_ID
+from timestamps import BACKFILL_JOB, EpochBackfill
+
+# The integer timestamp backfill (SQLite only: the PostgreSQL schema was born with the columns).
+
+
+def old_rows(repo, count):
+    """Tasks and time entries with empty integer columns, like rows from before migration 9."""
+    user = repo.create_user("old", "Old Timer", "old@example.com", "!", DEFAULT_TEAM_ID)
+    for i in range(count):
+        task = repo.add_task(f"Old {i}", None, "medium", None, "Monday", user["id"], DEFAULT_TEAM_ID)
+        repo.conn.execute("""
+        INSERT INTO time_entries (task_id, user_id, start_time, end_time, work_date, duration_minutes)
+        VALUES (?, ?, '2026-10-12 09:00:00', '2026-10-12 09:30:00', '2026-10-12', 30)
+        """, (task["id"], user["id"]))
+    repo.conn.execute("UPDATE tasks SET created_ts = NULL, updated_ts = NULL")
+    repo.conn.execute("UPDATE time_entries SET start_ts = NULL, end_ts = NULL, work_day = NULL")
+    repo.conn.execute("UPDATE background_jobs SET done_at = NULL WHERE name = ?", (BACKFILL_JOB,))
+
+def test_backfill_fills_old_rows_once(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "old.db"), size=2)
+    store = SQLiteStore(pool)
+    store.prepare()
+    with store.session() as repo:
+        with repo.transaction():
+            old_rows(repo, 5)
+        worker = EpochBackfill(store, batch_size=2, pause=0)
+        assert worker.pending()
+
+        # another process holds the lease: leave it alone
+        with repo.transaction():
+            repo.conn.execute("UPDATE background_jobs SET leased_until = DATETIME('now', '+1 minute')")
+        assert worker.run() is None and worker.pending()
+        with repo.transaction():
+            repo.conn.execute("UPDATE background_jobs SET leased_until = DATETIME('now', '-1 second')")
+
+        # stopped midway: the lease is handed back
+        stop = threading.Event()
+        stop.set()
+        assert worker.run(stop) is None
+        assert repo.conn.execute("SELECT leased_until FROM background_jobs").fetchone()[0] is None
+
+        assert worker.run() == {"tasks": 5, "time_entries": 5}
+        assert not worker.pending()
+        assert repo.conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE created_ts = CAST(strftime('%s', created_at) AS INTEGER)").fetchone()[0] == 5
+        assert repo.conn.execute(
+            "SELECT COUNT(*) FROM time_entries WHERE duration_minutes = (end_ts - start_ts) / 60").fetchone()[0] == 5
+        assert worker.run() is None
+    pool.close_all()
+
+def test_app_starts_the_backfill(app):
+    with app.test_request_context():
+        get_conn()
+    worker = app.extensions["backfills"]["main"]
+    worker._thread.join(5)
+    assert not worker.pending()
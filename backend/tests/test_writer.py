@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from writer import GroupCommitWriter, WriterBusy
+
+# The group-commit writer on every backend (see conftest.BACKENDS).
+
+
+@pytest.fixture
+def writer(store):
+    writer = GroupCommitWriter(store, max_delay=0.01, timeout=5.0)
+    yield writer
+    writer.stop()
+
+
+def publish(repo, kind):
+    return repo.publish_event(kind, {})
+
+def fail(repo, kind):
+    repo.publish_event(kind, {})
+    raise ValueError(kind)
+
+def kinds(repo):
+    return [event[1] for event in repo.events_after(0)]
+
+def test_failing_intent_undoes_only_its_own_writes(repo, writer):
+    futures = [writer.submit(publish, "first"), writer.submit(fail, "failed"), writer.submit(publish, "last")]
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert kinds(repo) == ["first", "last"]
+    assert writer.stats()["failed"] == 1
+
+def test_timeout_withdraws_a_queued_intent(repo, writer):
+    started, release = threading.Event(), threading.Event()
+
+    def block(repo):
+        started.set()
+        release.wait(5)
+    blocker = writer.submit(block)
+    assert started.wait(5)
+    writer.timeout = 0.05
+    with pytest.raises(WriterBusy):
+        writer.write(publish, "withdrawn")
+    assert writer.stats()["timed_out"] == 1
+    release.set()
+    blocker.result(5)
+    writer.timeout = 5.0
+    writer.write(publish, "next")
+    assert kinds(repo) == ["next"]
+
+def test_timeout_waits_a_bounded_time_for_an_intent_already_committing(repo, writer):
+    def slow(repo, kind, seconds):
+        time.sleep(seconds)
+        return publish(repo, kind)
+    writer.write(publish, "warm-up")  # the writer thread is running
+    writer.timeout = 0.2
+    # past the first timeout but within the second: the result is returned
+    assert writer.write(slow, "slow", 0.3)
+    assert writer.stats()["timed_out"] == 0
+    # past both: WriterBusy after about two timeouts, though the intent still commits
+    started = time.perf_counter()
+    with pytest.raises(WriterBusy):
+        writer.write(slow, "slower", 0.8)
+    assert time.perf_counter() - started < 0.6
+    assert writer.stats()["timed_out"] == 1
+    writer.timeout = 5.0
+    writer.write(publish, "next")
+    assert kinds(repo) == ["warm-up", "slow", "slower", "next"]
+
+def test_write_charges_the_batch_statements(store, writer):
+    charged = []
+    writer.write(publish, "one", charge=lambda *share: charged.append(share))
+    [(statements, seconds, lock_seconds)] = charged
+    if store.backend == "sqlite":
+        # BEGIN IMMEDIATE, SAVEPOINT, RELEASE, COMMIT; not the intent's own INSERT
+        assert statements == 4
+        assert seconds >= lock_seconds > 0
@@ -0,0 +1,242 @@
+import threading
+import time
+from datetime import date, datetime
+
+# -----------------------
+# Integer timestamps
+# -----------------------
+# tasks.created_ts/updated_ts and time_entries.start_ts/end_ts hold the same wall-clock
+# value as their TEXT twin, as seconds since 1970-01-01 00:00:00; time_entries.work_day
+# is work_date as days since 1970-01-01. Range filters, ordering and duration arithmetic
+# use the integers. The TEXT columns are still written and stay the readable form.
+#
+# Rollout (migrations 9, 10 and 13):
+#   9  adds the columns and triggers that fill them for any writer that only sets the
+#      TEXT columns (e.g. a worker still running the previous release);
+#   10 builds the indexes on the integer columns, and fills the few open time entries so
+#      stopping a running timer computes its duration; the app reads the integers from then on;
+#   13 adds the background_jobs row through which one worker at a time leases the backfill.
+# backfill_epoch_columns() fills the remaining rows outside the migrations, in rowid ranges
+# with one short transaction per batch: EpochBackfill runs it on a thread once the schema is
+# up to date (or `flask backfill-timestamps` in the foreground). Requests carry on meanwhile;
+# until it is done, older rows have NULL integer columns, so they sort after newer ones and
+# are left out of date-range filters, reports and the timesheet.
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DAY = date(1970, 1, 1)
+
+# SQL for the same conversions (strftime('%s') reads the text as UTC, i.e. as wall clock)
+EPOCH_SQL = "CAST(strftime('%s', {}) AS INTEGER)"
+EPOCH_DAY_SQL = "(CAST(strftime('%s', {}) AS INTEGER) / 86400)"
+
+def epoch_seconds(dt):
+    """Naive datetime -> seconds since 1970-01-01 00:00:00 (sub-second part dropped)."""
+    return int((dt.replace(microsecond=0) - EPOCH).total_seconds())
+
+def stamp(dt):
+    """The (TEXT, integer) pair written for a timestamp column."""
+    return dt.strftime("%Y-%m-%d %H:%M:%S"), epoch_seconds(dt)
+
+def epoch_day(d):
+    """date (or datetime) -> days since 1970-01-01."""
+    if isinstance(d, datetime):
+        d = d.date()
+    return (d - EPOCH_DAY).days
+
+def _epoch(column):
+    return EPOCH_SQL.format(column)
+
+def _epoch_day(column):
+    return EPOCH_DAY_SQL.format(column)
+
+def epoch_columns_schema():
+    tasks_set = f"created_ts = {_epoch('NEW.created_at')}, updated_ts = {_epoch('NEW.updated_at')}"
+    entries_set = (f"start_ts = {_epoch('NEW.start_time')}, end_ts = {_epoch('NEW.end_time')}, "
+                   f"work_day = {_epoch_day('NEW.work_date')}")
+    # recursive_triggers is off, so the triggers' own UPDATEs don't re-fire them; the
+    # UPDATEs only touch integer columns, so the rollup and snapshot triggers don't fire either
+    return [
+        "ALTER TABLE tasks ADD COLUMN created_ts INTEGER",
+        "ALTER TABLE tasks ADD COLUMN updated_ts INTEGER",
+        "ALTER TABLE time_entries ADD COLUMN start_ts INTEGER",
+        "ALTER TABLE time_entries ADD COLUMN end_ts INTEGER",
+        "ALTER TABLE time_entries ADD COLUMN work_day INTEGER",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_epoch_insert
+        AFTER INSERT ON tasks
+        WHEN NEW.created_ts IS NULL OR NEW.updated_ts IS NULL
+        BEGIN
+            UPDATE tasks SET {tasks_set} WHERE id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_epoch_update
+        AFTER UPDATE OF created_at, updated_at ON tasks
+        WHEN NEW.created_ts IS NOT {_epoch('NEW.created_at')}
+          OR NEW.updated_ts IS NOT {_epoch('NEW.updated_at')}
+        BEGIN
+            UPDATE tasks SET {tasks_set} WHERE id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_time_entries_epoch_insert
+        AFTER INSERT ON time_entries
+        WHEN NEW.start_ts IS NULL OR NEW.work_day IS NULL
+          OR (NEW.end_time IS NOT NULL AND NEW.end_ts IS NULL)
+        BEGIN
+            UPDATE time_entries SET {entries_set} WHERE id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_time_entries_epoch_update
+        AFTER UPDATE OF start_time, end_time, work_date ON time_entries
+        WHEN NEW.start_ts IS NOT {_epoch('NEW.start_time')}
+          OR NEW.end_ts IS NOT {_epoch('NEW.end_time')}
+          OR NEW.work_day IS NOT {_epoch_day('NEW.work_date')}
+        BEGIN
+            UPDATE time_entries SET {entries_set} WHERE id = NEW.id;
+        END
+        """,
+    ]
+
+BACKFILL = [
+    ("tasks", f"""
+    UPDATE tasks SET created_ts = {_epoch('created_at')}, updated_ts = {_epoch('updated_at')}
+     WHERE id > ? AND id <= ? AND (created_ts IS NULL OR updated_ts IS NULL)
+    """),
+    ("time_entries", f"""
+    UPDATE time_entries
+       SET start_ts = {_epoch('start_time')}, end_ts = {_epoch('end_time')}, work_day = {_epoch_day('work_date')}
+     WHERE id > ? AND id <= ? AND (start_ts IS NULL OR work_day IS NULL)
+    """),
+]
+
+OPEN_ENTRIES_BACKFILL = f"""
+UPDATE time_entries SET start_ts = {_epoch('start_time')}, work_day = {_epoch_day('work_date')}
+ WHERE end_time IS NULL AND (start_ts IS NULL OR work_day IS NULL)
+"""
+
+BACKFILL_JOB = "epoch_backfill"
+BACKFILL_JOB_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS background_jobs(
+        name TEXT PRIMARY KEY,
+        leased_until TEXT,
+        done_at TEXT
+    ) WITHOUT ROWID
+    """,
+    f"INSERT OR IGNORE INTO background_jobs (name) VALUES ('{BACKFILL_JOB}')",
+]
+
+def backfill_pending(conn):
+    row = conn.execute("SELECT done_at FROM background_jobs WHERE name = ?", (BACKFILL_JOB,)).fetchone()
+    return row is not None and row[0] is None
+
+def backfill_epoch_columns(conn, batch_size=2000, pause=0.01, lease_seconds=60, stop=None):
+    """
+    Fill the integer columns of rows written before the sync triggers existed.
+    Walks each table by rowid range, committing every batch so the write lock is held
+    for milliseconds at a time. The worker holds a lease on its background_jobs row,
+    renewed with every batch, so only one process runs it; a worker that dies midway
+    leaves the rest to whoever takes the lease after it expires. Safe to repeat.
+    Returns {table: rows updated}, or None if it did not run to the end here: already
+    done, leased by another worker, or `stop` (a threading.Event) was set.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    lease = (f"+{lease_seconds} seconds", BACKFILL_JOB)
+    claimed = conn.execute("""
+    UPDATE background_jobs SET leased_until = DATETIME('now', ?)
+     WHERE name = ? AND done_at IS NULL AND (leased_until IS NULL OR leased_until < DATETIME('now'))
+    """, lease).rowcount
+    conn.commit()
+    if not claimed:
+        return None
+    updated = {}
+    for table, sql in BACKFILL:
+        # rows above this id were inserted after the triggers and are already filled
+        high = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        updated[table] = 0
+        for low in range(0, high, batch_size):
+            if stop is not None and stop.is_set():
+                conn.execute("UPDATE background_jobs SET leased_until = NULL WHERE name = ?", (BACKFILL_JOB,))
+                conn.commit()
+                return None
+            updated[table] += conn.execute(sql, (low, low + batch_size)).rowcount
+            conn.execute("UPDATE background_jobs SET leased_until = DATETIME('now', ?) WHERE name = ?", lease)
+            conn.commit()
+            if pause:
+                time.sleep(pause)  # let request writers in between batches
+    conn.execute("UPDATE background_jobs SET done_at = DATETIME('now'), leased_until = NULL WHERE name = ?",
+                 (BACKFILL_JOB,))
+    conn.commit()
+    return updated
+
+
+class EpochBackfill:
+    """
+    Background backfill_epoch_columns for one SQLite database, started by init_db.
+    While another process holds the lease it checks back every `lease_seconds`; it exits
+    once the backfill is done.
+    """
+
+    def __init__(self, store, batch_size=2000, pause=0.01, lease_seconds=60):
+        self.store = store
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease_seconds = lease_seconds
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="epoch-backfill", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, stop=None):
+        """One attempt in the calling thread. Returns backfill_epoch_columns' result."""
+        with self.store.session() as repo:
+            return repo.backfill_epoch_columns(batch_size=self.batch_size, pause=self.pause,
+                                               lease_seconds=self.lease_seconds, stop=stop)
+
+    def pending(self):
+        with self.store.session() as repo:
+            return repo.backfill_pending()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.pending():
+                    return
+                updated = self.run(self._stop)
+                if updated is not None:
+                    if any(updated.values()):
+                        print(f"[BACKFILL] Integer timestamps filled: {updated}")
+                    return
+            except Exception as e:
+                print(f"[BACKFILL ERROR] {e}")
+            self._stop.wait(self.lease_seconds)
+
+def epoch_indexes():
+    return [
+        # get_tasks() / /api/tasks: WHERE user_id = ? [AND status_rank = ?] ORDER BY created_ts DESC
+        "DROP INDEX IF EXISTS idx_tasks_user_status_created",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created_ts ON tasks(user_id, status_rank, created_ts DESC)",
+        # /report/weekly: WHERE user_id = ? AND created_ts >= ? AND created_ts < ?
+        "DROP INDEX IF EXISTS idx_tasks_user_created",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_created_ts ON tasks(user_id, created_ts, status)",
+        # /timesheet and the export: WHERE [user_id = ? AND] work_day BETWEEN ? AND ?
+        "DROP INDEX IF EXISTS idx_time_entries_user_date",
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_user_day ON time_entries(user_id, work_day, duration_minutes)",
+        "DROP INDEX IF EXISTS idx_time_entries_date",
+        "CREATE INDEX IF NOT EXISTS idx_time_entries_day ON time_entries(work_day)",
+    ]
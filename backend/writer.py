@@ -0,0 +1,214 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# -----------------------
+# Group-commit writer
+# -----------------------
+# Timer start/stop are tiny writes that arrive in bursts (everyone clocks in at the top of
+# the hour). Written from the request threads, each one takes SQLite's write lock, commits
+# on its own and lets the next one in; hundreds at once queue up on busy_timeout and the
+# slowest fail with "database is locked". Instead, request threads hand GroupCommitWriter
+# an intent (a function of a repository) and wait on its future. One writer thread per
+# database drains the queue into a single BEGIN IMMEDIATE transaction (waiting at most
+# `max_delay` seconds for more intents, taking at most `max_batch`), runs every intent
+# under its own savepoint so a failing one undoes only its writes, commits once and then
+# resolves the futures. At most `max_queue` intents wait; beyond that submit() raises
+# WriterBusy (a 503) rather than letting the backlog grow. write() also answers WriterBusy
+# when its intent is still queued after `timeout` seconds, and withdraws it; an intent
+# already in a batch may be committing, so it is waited for one more `timeout` before
+# WriterBusy (its writes may still land: the client is told to retry, not that they failed).
+#
+# The writer thread keeps its own connection (store.connect()), outside the request pool:
+# request threads hold a pooled connection while they wait on write(), so a writer drawing
+# from the same pool would wait for them forever once they hold every connection.
+#
+# The batch's own statements (BEGIN IMMEDIATE, the savepoints, COMMIT) run for all of its
+# intents at once. On SQLite's instrumented connections (db.py) the writer adds them up, and
+# write(..., charge=f) calls f(statements, seconds, lock_seconds) on the waiting thread with
+# its intent's share: an equal part of the statements, but the whole of the lock wait and
+# commit time, which every request in the batch sat through.
+
+
+class WriterBusy(Exception):
+    pass
+
+
+class GroupCommitWriter:
+    """Writer thread for one database (app.extensions["writers"][shard]). Starts with the first intent."""
+
+    def __init__(self, store, max_delay=0.002, max_batch=256, max_queue=1024, timeout=10.0):
+        self.store = store
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        # (intent, args, future, queued_at)
+        self._queue = queue.Queue(max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None  # the writer thread's own connection, opened with the first batch
+        self._in_intent = False
+        self._batch_sql = [0, 0.0, 0.0]  # statements, seconds, lock seconds outside the intents
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.intents = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_depth = 0
+        self.queue_seconds_total = 0.0
+        self.commit_seconds_total = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, intent, *args):
+        """Queue intent(repo, *args) for the next group commit. Returns a future of its result."""
+        self.start()
+        future = Future()
+        try:
+            self._queue.put_nowait((intent, args, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            raise WriterBusy("Write queue is full")
+        depth = self._queue.qsize()
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+        return future
+
+    def write(self, intent, *args, charge=None):
+        """
+        submit() and wait for the commit. Returns the intent's result or raises its exception.
+        charge, if given, receives the intent's share of its batch's statements (see above).
+        """
+        future = self.submit(intent, *args)
+        try:
+            future.exception(self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                # still queued: the writer will skip it
+                self.timed_out += 1
+                raise WriterBusy("Write queue timed out") from None
+            # already in a batch: its outcome is on the way, give it one more timeout
+            try:
+                future.exception(self.timeout)
+            except FutureTimeout:
+                self.timed_out += 1
+                raise WriterBusy("Write timed out while committing") from None
+        share = getattr(future, "batch_sql", None)
+        if charge is not None and share is not None:
+            charge(*share)
+        return future.result()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    batch = [self._queue.get(timeout=1.0)]
+                except queue.Empty:
+                    continue
+                deadline = time.perf_counter() + self.max_delay
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+                    except queue.Empty:
+                        break
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    print(f"[WRITER ERROR] {e}")
+        finally:
+            self._disconnect()
+
+    def _repository(self):
+        if self._conn is None:
+            self._conn = self.store.connect()
+            if hasattr(self._conn, "add_observer"):
+                self._conn.add_observer(self._observe)
+        return self.store.repository(self._conn)
+
+    def _observe(self, sql, parameters, seconds, locking):
+        # the intents' own statements are counted by their requests (app.write_intent)
+        if not self._in_intent:
+            self._batch_sql[0] += 1
+            self._batch_sql[1] += seconds
+            if locking:
+                self._batch_sql[2] += seconds
+
+    def _disconnect(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _commit(self, batch):
+        # drop intents whose writer gave up waiting; the rest can no longer be cancelled
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        outcomes = []
+        self._batch_sql = [0, 0.0, 0.0]
+        try:
+            repo = self._repository()
+            with repo.transaction(immediate=True):
+                for intent, args, future, queued_at in batch:
+                    try:
+                        with repo.savepoint():
+                            self._in_intent = True
+                            try:
+                                outcomes.append((future, intent(repo, *args), None))
+                            finally:
+                                self._in_intent = False
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # nothing in the batch was written; the next batch starts on a new connection
+            # in case this one is broken
+            self._disconnect()
+            self.failed += len(batch)
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        self.batches += 1
+        self.intents += len(batch)
+        self.commit_seconds_total += finished - started
+        self.queue_seconds_total += sum(started - queued_at for _, _, _, queued_at in batch)
+        statements, seconds, lock_seconds = self._batch_sql
+        for future, result, error in outcomes:
+            # set before the outcome, which is what write() waits on
+            future.batch_sql = (statements / len(batch), seconds, lock_seconds)
+            if error is None:
+                future.set_result(result)
+            else:
+                self.failed += 1
+                future.set_exception(error)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_queue,
+            "queue_peak_depth": self.peak_depth,
+            "queue_seconds_total": round(self.queue_seconds_total, 6),
+            "commit_seconds_total": round(self.commit_seconds_total, 6),
+            "batches": self.batches,
+            "intents": self.intents,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }